@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Measures how long `import thehylia` takes (with python -X importtime) and
+# how long `thehylia.py --help` takes to run, which is what scripts that
+# run thehylia.py over and over pay every time.
+#
+# Exits with an error if importing takes longer than --budget milliseconds,
+# so it can keep slow imports from creeping back in.
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, 'thehylia.py')
+
+# Milliseconds. requests and Beautiful Soup alone take well over this.
+DEFAULT_BUDGET = 60
+
+
+def importTimes():
+    """Return how many microseconds `import thehylia` takes in a fresh
+    interpreter, and a list of (module, microseconds) for each module it
+    imports directly (including whatever those import).
+    """
+    process = subprocess.Popen([sys.executable, '-X', 'importtime', '-c', 'import thehylia'],
+                               cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               universal_newlines=True)
+    _, output = process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(output)
+    # Each import is listed after the ones it made, indented by two more
+    # spaces than them.
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        depth = (len(module) - len(module.lstrip())) // 2
+        imports.append((module.strip(), depth, int(cumulative)))
+
+    total = [cumulative for module, depth, cumulative in imports
+             if module == 'thehylia' and depth == 0][0]
+    children = []
+    for module, depth, cumulative in reversed(imports[:-1]):
+        if depth == 0:
+            break
+        if depth == 1:
+            children.append((module, cumulative))
+    return total, children
+
+
+def helpTime():
+    start = time.time()
+    with open(os.devnull, 'w') as nowhere:
+        subprocess.check_call([sys.executable, SCRIPT, '--help'], stdout=nowhere, stderr=nowhere)
+    return time.time() - start
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how long thehylia.py takes to start.")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET,
+                        help="Fail if importing takes longer than this many milliseconds "
+                        "(default: {}).".format(DEFAULT_BUDGET))
+    parser.add_argument('--top', type=int, default=10, help="How many of the slowest imports to list.")
+    arguments = parser.parse_args()
+
+    if sys.version_info < (3, 7):
+        print("python -X importtime needs Python 3.7 or newer.", file=sys.stderr)
+        return 1
+
+    runs = [importTimes() for _ in range(arguments.runs)]
+    importMs = median(total for total, _ in runs) / 1000
+    helpMs = median(helpTime() for _ in range(arguments.runs)) * 1000
+
+    slowest = sorted(runs[-1][1], key=lambda child: child[1], reverse=True)
+    print("Slowest imports (ms, including what they import):")
+    for module, cumulative in slowest[:arguments.top]:
+        print("    {:<30}{:>8.1f}".format(module, cumulative / 1000))
+    print()
+    print("import thehylia:      {:>8.1f} ms".format(importMs))
+    print("thehylia.py --help:   {:>8.1f} ms".format(helpMs))
+
+    if importMs > arguments.budget:
+        print("\nOver budget! Importing should take no more than {:.0f} ms.".format(arguments.budget),
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Measures how much memory downloading an album takes (of Python objects,
+# via tracemalloc) for albums of different sizes, both fetching every
+# song's page and working the songs' files out from the album page.
+#
+# Songs are resolved and downloaded one after the other, pages are thrown
+# away as soon as what's needed has been scraped from them, and Song and
+# File objects are kept small, so the only things that grow with the number
+# of tracks are the album page itself (parsed once, and the biggest part of
+# the peak) and what's kept for each song - whether or not every song page
+# is fetched. "Kept" is what the Soundtrack holds on to afterwards.
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import gc
+import shutil
+import tempfile
+import tracemalloc
+
+from mockhylia import MockHyliaProcess
+
+import thehylia
+
+
+def measure(albumId, workers, fastResolve):
+    thehylia.FAST_RESOLVE = fastResolve
+    path = tempfile.mkdtemp()
+    try:
+        tracemalloc.start()
+        soundtrack = thehylia.Soundtrack(albumId)
+        if not soundtrack.download(path, workers=workers):
+            raise RuntimeError("Not every file was downloaded.")
+        # Parsed pages are full of reference cycles, so they're only freed
+        # once the garbage collector gets to them.
+        gc.collect()
+        kept, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        shutil.rmtree(path)
+    return peak, kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure thehylia.py's memory use against album size.")
+    parser.add_argument('--sizes', default='50,200,800',
+                        help="Comma-separated album sizes, in tracks (default: 50,200,800).")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--file-size', type=int, default=64 * 1024, help="Bytes per file.")
+    arguments = parser.parse_args()
+
+    thehylia.setCache(None)
+    sizes = [int(size) for size in arguments.sizes.split(',')]
+
+    # Get the imports and the like out of the way, so they're not measured.
+    with MockHyliaProcess(trackCount=2, fileSize=arguments.file_size) as mock:
+        thehylia.BASE_URL = mock.baseUrl
+        measure('warm-up', arguments.workers, False)
+
+    print("{:>8}{:<16}{:>12}{:>12}{:>16}".format(
+          "Tracks", "  Songs from", "Peak (KB)", "Kept (KB)", "Kept per track"))
+    results = {}
+    for trackCount in sizes:
+        with MockHyliaProcess(trackCount=trackCount, fileSize=arguments.file_size) as mock:
+            thehylia.BASE_URL = mock.baseUrl
+            thehylia.setSession(None)
+            for label, fastResolve in (("song pages", False), ("album page", True)):
+                peak, kept = measure('benchmark-{}'.format(trackCount), arguments.workers,
+                                     fastResolve)
+                results[trackCount, fastResolve] = peak
+                print("{:>8}  {:<14}{:>12.0f}{:>12.0f}{:>14.0f} B".format(
+                      trackCount, label, peak / 1024, kept / 1024, kept / trackCount))
+
+    if len(sizes) > 1:
+        print()
+        for label, fastResolve in (("song pages", False), ("album page", True)):
+            growth = ((results[sizes[-1], fastResolve] - results[sizes[0], fastResolve]) /
+                      (sizes[-1] - sizes[0]))
+            print("Peak grows by {:.0f} bytes per track ({}).".format(growth, label))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Compares how long it takes to fix up and parse big album and search pages
+# the old way (byte-splicing fixups and the whole page through html.parser)
+# and the new way (fixHtml, PARSER and only #content_container), and checks
+# that both scrape the same info.
+#
+# Usage: python benchmarks/bench_parse.py [saved page.html ...]
+# Without any saved pages, made-up pages from mockhylia are used.
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import re
+import sys
+import timeit
+
+import mockhylia
+
+import thehylia
+from bs4 import BeautifulSoup
+
+
+def oldParseSoup(content):
+    """getSoup's parsing as it used to be."""
+    removeRe = re.compile(br"^</td>\s*$", re.MULTILINE)
+    content = removeRe.sub(b'', content)
+    
+    badDivTag = b'<div style="padding: 7px; float: left;">'
+    badDivLength = len(badDivTag)
+    badDivStart = content.find(badDivTag)
+    while badDivStart != -1:
+        badAEnd = content.find(b'</a>', badDivStart)
+        content = content[:badAEnd] + content[badAEnd + 4:]
+        
+        badDivEnd = content.find(b'</div>', badDivStart)
+        content = content[:badDivEnd + 6] + b'</a>' + content[badDivEnd + 6:]
+        
+        badDivStart = content.find(badDivTag, badDivStart + badDivLength)
+    
+    return BeautifulSoup(content, 'html.parser')
+
+
+def scraperFor(content):
+    if b'Found ' in content and b'matching albums' in content:
+        return thehylia.THE_HYLIA.scrapeSearch
+    return thehylia.Soundtrack('benchmark')._scrape
+
+
+def fixturePages():
+    if len(sys.argv) > 1:
+        for path in sys.argv[1:]:
+            with open(path, 'rb') as f:
+                yield path, f.read()
+        return
+    for trackCount, imageCount in ((100, 2), (500, 2), (500, 200)):
+        yield ("Album, {} tracks/{} images".format(trackCount, imageCount),
+               mockhylia.albumPage('benchmark', trackCount, imageCount))
+    searchResults = ['album-{}'.format(i) for i in range(1000)]
+    yield "Search, 1000 results", mockhylia.searchPage('album', searchResults)
+
+
+def main():
+    print("Parser: {}".format(thehylia.PARSER))
+    print("{:<32}{:>10}{:>10}{:>10}".format("", "Old (ms)", "New (ms)", "Speedup"))
+    for name, content in fixturePages():
+        scrape = scraperFor(content)
+        if scrape(oldParseSoup(content)) != scrape(thehylia.parseSoup(content)):
+            print("{}: the old and new ways scrape different info!".format(name), file=sys.stderr)
+            return 1
+        # Keep the fixups honest too.
+        old = oldParseSoup(content).find(id='content_container')
+        new = BeautifulSoup(thehylia.fixHtml(content), 'html.parser').find(id='content_container')
+        if old != new:
+            print("{}: the old and new fixups differ!".format(name), file=sys.stderr)
+            return 1
+
+        runs = 5
+        oldTime = min(timeit.repeat(lambda: oldParseSoup(content), number=1, repeat=runs))
+        newTime = min(timeit.repeat(lambda: thehylia.parseSoup(content), number=1, repeat=runs))
+        print("{:<32}{:>10.1f}{:>10.1f}{:>9.1f}x".format(
+            name, oldTime * 1000, newTime * 1000, oldTime / newTime))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
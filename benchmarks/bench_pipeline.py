@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Benchmarks each stage of thehylia.py's pipeline - fetching and parsing
+# an album page, getting the song list, resolving every song's files,
+# searching, and downloading the whole album - against a local stand-in
+# for The Hylia, for albums of different sizes.
+#
+# Reports wall time, requests made, throughput and peak memory (of Python
+# objects, via tracemalloc) for each. Run with --help for the options,
+# which include latency, bandwidth and failure injection, and --json to
+# get the results in a form that's easy to compare between versions.
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from mockhylia import MockHyliaProcess
+
+import thehylia
+
+
+def measure(mock, func):
+    """Run `func`, returning a dict of how it went."""
+    mock.resetCounts()
+    tracemalloc.start()
+    start = time.time()
+    try:
+        func()
+    finally:
+        elapsed = time.time() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    stats = mock.stats()
+    return {
+        'seconds': elapsed,
+        'requests': stats['requests'],
+        'connections': stats['connections'],
+        'failuresInjected': stats['failures'],
+        'megabytes': stats['bytesSent'] / 1024 / 1024,
+        'megabytesPerSecond': stats['bytesSent'] / 1024 / 1024 / elapsed if elapsed else 0,
+        'peakMemoryMegabytes': peak / 1024 / 1024
+    }
+
+
+def stages(trackCount, workers):
+    albumId = 'benchmark-{}'.format(trackCount)
+
+    def album():
+        thehylia.getSoup(thehylia.Soundtrack(albumId).url)
+
+    def songList():
+        thehylia.Soundtrack(albumId).songs
+
+    def songFiles():
+        songs = thehylia.Soundtrack(albumId).songs
+        thehylia.parallelMap(lambda song: song.files, songs, workers)
+
+    def resolvedFiles():
+        soundtrack = thehylia.Soundtrack(albumId)
+        soundtrack.resolveFiles()
+        thehylia.parallelMap(lambda song: song.files, soundtrack.songs, workers)
+
+    def searching():
+        thehylia.search('benchmark')
+
+    def download():
+        path = tempfile.mkdtemp()
+        try:
+            if not thehylia.download(albumId, path, workers=workers):
+                raise RuntimeError("Not every file was downloaded.")
+        finally:
+            shutil.rmtree(path)
+
+    return [("getSoup (album page)", album),
+            ("Soundtrack.songs", songList),
+            ("Song.files (all songs)", songFiles),
+            ("Soundtrack.resolveFiles", resolvedFiles),
+            ("search", searching),
+            ("Soundtrack.download", download)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark thehylia.py against a local stand-in for The Hylia.")
+    parser.add_argument('--sizes', default='10,50,100,500',
+                        help="Comma-separated album sizes, in tracks (default: 10,50,100,500).")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--file-size', type=int, default=256 * 1024, help="Bytes per file.")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every response.")
+    parser.add_argument('--connect-latency', type=float, default=0.0,
+                        help="Seconds added to every new connection.")
+    parser.add_argument('--bandwidth', type=float, help="Bytes per second per response.")
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help="Fraction of requests that fail (with a 503 or a dropped connection).")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+    arguments = parser.parse_args()
+
+    # Every run should fetch everything.
+    thehylia.setCache(None)
+    thehylia.BACKOFF_BASE = 0.01
+
+    results = []
+    for trackCount in [int(size) for size in arguments.sizes.split(',')]:
+        with MockHyliaProcess(trackCount=trackCount, fileSize=arguments.file_size,
+                              latency=arguments.latency, connectLatency=arguments.connect_latency,
+                              bandwidth=arguments.bandwidth,
+                              failureRate=arguments.failure_rate) as mock:
+            thehylia.BASE_URL = mock.baseUrl
+            thehylia.setSession(None) # No connections kept from the last size.
+            for stage, func in stages(trackCount, arguments.workers):
+                result = measure(mock, func)
+                result.update({'tracks': trackCount, 'stage': stage})
+                results.append(result)
+                if not arguments.json:
+                    if stage == "getSoup (album page)":
+                        print("\n{} tracks, {} workers".format(trackCount, arguments.workers))
+                        print("{:<26}{:>10}{:>10}{:>10}{:>10}{:>12}".format(
+                              "", "Time (s)", "Requests", "MB", "MB/s", "Peak (MB)"))
+                    print("{stage:<26}{seconds:>10.2f}{requests:>10}{megabytes:>10.1f}"
+                          "{megabytesPerSecond:>10.1f}{peakMemoryMegabytes:>12.1f}".format(**result))
+
+    if arguments.json:
+        json.dump(results, sys.stdout, indent=1, sort_keys=True)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Compares downloading an album with a new connection for every request
+# (what plain requests.get does) against the shared, pooled session.
+#
+# Usage: python benchmarks/bench_session.py [track count] [connect latency]
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import shutil
+import sys
+import tempfile
+import time
+
+from mockhylia import MockHylia
+
+import requests
+import thehylia
+
+
+class OneShotSession(object):
+    """Like the module-level requests functions: a new connection every time."""
+    def request(self, method, url, **kwargs):
+        return requests.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return requests.get(url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return requests.head(url, **kwargs)
+
+
+def timeDownload(mock, session, workers):
+    thehylia.setSession(session)
+    mock.resetCounts()
+    path = tempfile.mkdtemp()
+    try:
+        start = time.time()
+        thehylia.download('benchmark-album', path, formatOrder=['mp3'], workers=workers)
+        elapsed = time.time() - start
+    finally:
+        shutil.rmtree(path)
+    return elapsed, mock.connections, mock.requests
+
+
+def main():
+    trackCount = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    # Roughly what a TLS handshake to the real site costs.
+    connectLatency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+
+    with MockHylia(trackCount=trackCount, connectLatency=connectLatency) as mock:
+        thehylia.BASE_URL = mock.baseUrl
+        print("{} tracks, {:.0f} ms per new connection".format(trackCount, connectLatency * 1000))
+        print("{:<28}{:>10}{:>14}{:>11}".format("", "Time (s)", "Connections", "Requests"))
+        for workers in (1, 4):
+            for name, session in (("requests.get", OneShotSession()),
+                                  ("Pooled session", thehylia.makeSession())):
+                elapsed, connections, requestCount = timeDownload(mock, session, workers)
+                label = "{}, {} worker{}".format(name, workers, "s" if workers > 1 else "")
+                print("{:<28}{:>10.2f}{:>14}{:>11}".format(label, elapsed, connections, requestCount))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,472 @@
+# -*- coding: utf-8 -*-
+
+# A local stand-in for The Hylia, for benchmarking thehylia.py without
+# hitting the real site. Album, song and search pages mimic the real
+# site's markup (broken bits included), and files are made up on the fly.
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import hashlib
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, quote, unquote, urlsplit
+    from urllib.request import urlopen
+except ImportError: # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urllib import quote, unquote
+    from urllib2 import urlopen
+    from urlparse import parse_qs, urlsplit
+
+# So that the benchmarks can `import thehylia` from the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FORMATS = ['mp3', 'flac']
+
+
+def songFilename(number, extension='mp3'):
+    return "{:02d} Track {}.{}".format(number, number, extension)
+
+
+def oddFilename(number, extension='mp3'):
+    # For songs whose files aren't named after their song pages.
+    return "{:02d} Track {} (Alternate).{}".format(number, number, extension)
+
+
+def listedSize(size):
+    return "7.12 MB" if size is None else "{:.2f} MB".format(size / 1024.0 / 1024)
+
+
+def imageFilename(number):
+    return "scan-{:02d}.jpg".format(number)
+
+
+def albumPage(albumId, trackCount, imageCount=2, fileSize=None):
+    images = ''.join(
+        '<a href="/files/{albumId}/{href}" target="_blank">'
+        '<div style="padding: 7px; float: left;"><img src="/files/{albumId}/{href}" width="100"></a>'
+        '</div>\n'.format(albumId=albumId, href=imageFilename(number))
+        for number in range(1, imageCount + 1))
+    rows = []
+    for number in range(1, trackCount + 1):
+        rows.append(
+            '<tr>\n'
+            '<td align="center">{number}.</td>\n'
+            '<td><a href="/soundtracks/album/{albumId}/{href}">Track {number}</a></td>\n'
+            '<td align="right">{size}</td>\n'
+            '<td align="right">{flacSize}</td>\n'
+            '</td>\n' # Stray closing tags, like the real thing.
+            '</tr>\n'.format(albumId=albumId, number=number,
+                             href=quote(songFilename(number)), size=listedSize(fileSize),
+                             flacSize="31.50 MB" if fileSize is None else listedSize(fileSize)))
+    return (
+        '<!DOCTYPE html>\n<html><head><title>{albumId}</title></head><body>\n'
+        '<div id="header"><a href="/">The Hylia</a></div>\n'
+        '<div id="content_container">\n'
+        '<div id="sidebar"><p>Sidebar</p></div>\n'
+        '<div><div>\n'
+        '<h2>{albumId}</h2>\n'
+        '<p align="left">\n'
+        '{images}'
+        'Number of Files: {trackCount}<br>\n'
+        '</p>\n'
+        '<table>\n'
+        '<tr><td></td><td><b>Song Name</b></td><td><b>MP3</b></td><td><b>FLAC</b></td></tr>\n'
+        '{rows}'
+        '</table>\n'
+        '</div></div>\n'
+        '</div>\n'
+        '<div id="footer">Footer</div>\n'
+        '</body></html>\n'
+    ).format(albumId=albumId, trackCount=trackCount, images=images,
+             rows=''.join(rows)).encode('utf-8')
+
+
+def songPage(albumId, filename, odd=False):
+    name = filename.rsplit('.', 1)[0]
+    fileName = name + " (Alternate)" if odd else name
+    links = ''.join(
+        '<tr><td><b><a href="/files/{albumId}/{href}">Download to Computer ({extension})</a></b></td></tr>\n'.format(
+            albumId=albumId, href=quote(fileName + '.' + extension), extension=extension.upper())
+        for extension in FORMATS)
+    return (
+        '<!DOCTYPE html>\n<html><head><title>{name}</title></head><body>\n'
+        '<div id="content_container">\n'
+        '<p align="left">Album name: <b>{albumId}</b><br>\n'
+        'Song name: <b>{name}</b><br>\n'
+        'File size: <b>7.12 MB</b></p>\n'
+        '<table class="blog">\n{links}</table>\n'
+        '</div>\n'
+        '</body></html>\n'
+    ).format(albumId=albumId, name=name, links=links).encode('utf-8')
+
+
+def searchPage(term, albumIds, page=1, pageSize=None):
+    pageSize = pageSize or len(albumIds) or 1
+    pageIds = albumIds[(page - 1) * pageSize:page * pageSize]
+    links = '<br>\n'.join('<a href="/soundtracks/album/{0}">{0}</a>'.format(albumId)
+                          for albumId in pageIds)
+    nextLink = ''
+    if page * pageSize < len(albumIds):
+        nextLink = '<p><a href="/search?search={}&amp;page={}">Next &raquo;</a></p>\n'.format(
+            quote(term), page + 1)
+    return (
+        '<!DOCTYPE html>\n<html><head><title>Search</title></head><body>\n'
+        '<div id="content_container">\n'
+        '<p>Found {count} matching albums for "{term}".</p>\n'
+        '<p>{links}</p>\n'
+        '{nextLink}'
+        '</div>\n'
+        '</body></html>\n'
+    ).format(count=len(albumIds), term=term, links=links, nextLink=nextLink).encode('utf-8')
+
+
+def albumTitle(albumId):
+    return albumId.replace('-', ' ').title()
+
+
+def listingPage(albumIds, page=1, pageSize=None):
+    pageSize = pageSize or len(albumIds) or 1
+    pageIds = albumIds[(page - 1) * pageSize:page * pageSize]
+    links = '<br>\n'.join('<a href="/soundtracks/album/{}">{}</a>'.format(albumId, albumTitle(albumId))
+                          for albumId in pageIds)
+    nextLink = ''
+    if page * pageSize < len(albumIds):
+        nextLink = '<p><a href="/soundtracks/browse/all?page={}">Next &raquo;</a></p>\n'.format(page + 1)
+    return (
+        '<!DOCTYPE html>\n<html><head><title>Browse</title></head><body>\n'
+        '<div id="header"><a href="/">The Hylia</a></div>\n'
+        '<div id="content_container">\n'
+        '<p>{links}</p>\n'
+        '{nextLink}'
+        '</div>\n'
+        '</body></html>\n'
+    ).format(links=links, nextLink=nextLink).encode('utf-8')
+
+
+def fileContent(path, size):
+    pattern = path.encode('utf-8') + b'\n'
+    return (pattern * (size // len(pattern) + 1))[:size]
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def get_request(self):
+        # Only once per connection, so this is where new connections are
+        # counted and where the cost of setting one up is simulated.
+        request = HTTPServer.get_request(self)
+        # Like real web servers - otherwise, Nagle's algorithm makes every
+        # kept-alive response wait for a delayed ACK.
+        request[0].setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.mock._count('connections')
+        return request
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # For keep-alive.
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        if self.server.mock.connectLatency:
+            time.sleep(self.server.mock.connectLatency)
+
+    def do_HEAD(self):
+        self.do_GET(sendBody=False)
+
+    def do_GET(self, sendBody=True):
+        mock = self.server.mock
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.strip('/').split('/')]
+
+        # For MockHyliaProcess.
+        if parts == ['_stats']:
+            self._respond(200, json.dumps(mock.stats()).encode('utf-8'), sendBody=sendBody)
+            return
+        if parts == ['_reset']:
+            mock.resetCounts()
+            self._respond(200, b'', sendBody=sendBody)
+            return
+
+        mock._count('requests')
+        if mock.latency:
+            time.sleep(mock.latency)
+
+        isFile = False
+        if parts[:2] == ['soundtracks', 'album'] and len(parts) == 3:
+            body = albumPage(parts[2], mock.trackCount, fileSize=mock.fileSize)
+        elif parts[:2] == ['soundtracks', 'album'] and len(parts) == 4:
+            body = songPage(parts[2], parts[3], self._oddTrack(parts[3]) is not None)
+        elif parts == ['search']:
+            query = parse_qs(url.query)
+            page = int(query.get('page', ['1'])[0])
+            body = searchPage(query.get('search', [''])[0], mock.searchResults,
+                              page, mock.searchPageSize)
+        elif parts == ['soundtracks', 'browse', 'all']:
+            page = int(parse_qs(url.query).get('page', ['1'])[0])
+            body = listingPage(mock.catalogue, page, mock.searchPageSize)
+        elif parts[0] == 'files' and len(parts) == 3 and self._oddTrack(parts[2]) is not None:
+            if mock.oddStatus == 200:
+                self._respond(200, b'<html><body>Not found.</body></html>', sendBody=sendBody)
+            else:
+                self._respond(mock.oddStatus, b'', sendBody=sendBody)
+            return
+        elif parts[0] == 'files' and len(parts) == 3:
+            body = fileContent(url.path, mock.fileSize)
+            isFile = True
+        else:
+            self._respond(404, b'', sendBody=sendBody)
+            return
+
+        failure = mock._failure() if sendBody else None
+        if failure == 'busy':
+            self._respond(503, b'', extraHeaders={'Retry-After': '0'})
+            return
+
+        etag = '"{}"'.format(hashlib.md5(body).hexdigest())
+        headers = {'ETag': etag}
+        if self.headers.get('If-None-Match') == etag:
+            self._respond(304, b'', headers, sendBody)
+            return
+        status = 200
+        if isFile:
+            headers['Accept-Ranges'] = 'bytes'
+            start = self._rangeStart()
+            if self.headers.get('If-Range', etag) != etag:
+                start = None # It's changed since - so the whole file.
+            if start is not None:
+                if start >= len(body):
+                    headers['Content-Range'] = 'bytes */{}'.format(len(body))
+                    self._respond(416, b'', headers, sendBody)
+                    return
+                headers['Content-Range'] = 'bytes {}-{}/{}'.format(start, len(body) - 1, len(body))
+                body = body[start:]
+                status = 206
+        self._respond(status, body, headers, sendBody, dropHalfway=failure == 'drop')
+
+    def _oddTrack(self, filename):
+        # The number of the odd track that `filename` (of a song page, or
+        # of a file named after it) is for, if it is one.
+        for number in self.server.mock.oddTracks:
+            if filename in [songFilename(number, extension) for extension in FORMATS]:
+                return number
+        return None
+
+    def _rangeStart(self):
+        rangeHeader = self.headers.get('Range', '')
+        if rangeHeader.startswith('bytes=') and rangeHeader.endswith('-'):
+            return int(rangeHeader[len('bytes='):-1])
+        return None
+
+    def _respond(self, status, body, extraHeaders=None, sendBody=True, dropHalfway=False):
+        mock = self.server.mock
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for header, value in (extraHeaders or {}).items():
+            self.send_header(header, value)
+        self.end_headers()
+        if not sendBody:
+            return
+
+        end = len(body) // 2 if dropHalfway else len(body)
+        chunkSize = 16 * 1024
+        for start in range(0, end, chunkSize):
+            chunk = body[start:min(start + chunkSize, end)]
+            self.wfile.write(chunk)
+            mock._count('bytesSent', len(chunk))
+            if mock.bandwidth:
+                time.sleep(len(chunk) / float(mock.bandwidth))
+        if dropHalfway:
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+
+
+class MockHylia(object):
+    """A stand-in for The Hylia running on a local port in the background.
+
+    Every album has `trackCount` songs, every file is `fileSize` bytes,
+    and searches find `searchResults`, `searchPageSize` per page (or all
+    on one page if it's None). The list of every soundtrack has
+    `catalogueSize` soundtracks, `searchPageSize` per page too.
+
+    To make it more like the real thing, set `connectLatency` to make each
+    new connection cost that many seconds (like a TLS handshake would),
+    `latency` to delay every response by that many seconds, and
+    `bandwidth` to send no more than that many bytes per second per
+    response. Set `failureRate` to make that fraction of requests fail,
+    half with a 503 and half by dropping the connection halfway through.
+
+    The files of the songs numbered in `oddTracks` aren't named after their
+    song pages (see oddFilename), so the files thehylia.py works out for
+    them from the album page aren't there - they get `oddStatus`, which is
+    404, or 200 with a short "not found" page like some sites send.
+
+    Properties:
+    * baseUrl:     The URL to use as thehylia.BASE_URL.
+    * connections: How many connections have been made so far.
+    * requests:    How many requests have been made so far.
+    * bytesSent:   How many bytes of response bodies have been sent so far.
+    * failures:    How many requests have been made to fail so far.
+    """
+
+    def __init__(self, trackCount=20, fileSize=64 * 1024, searchResults=None, searchPageSize=None,
+                 catalogueSize=100, connectLatency=0.0, latency=0.0, bandwidth=None,
+                 failureRate=0.0, seed=0, oddTracks=None, oddStatus=404):
+        self.trackCount = trackCount
+        self.fileSize = fileSize
+        self.searchResults = searchResults or ['album-{}'.format(i) for i in range(1, 11)]
+        self.catalogue = ['album-{}'.format(i) for i in range(1, catalogueSize + 1)]
+        self.searchPageSize = searchPageSize
+        self.connectLatency = connectLatency
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.failureRate = failureRate
+        self.oddTracks = set(oddTracks or [])
+        self.oddStatus = oddStatus
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self.resetCounts()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_):
+        self.stop()
+
+    @property
+    def baseUrl(self):
+        return 'http://127.0.0.1:{}/'.format(self._server.server_address[1])
+
+    def start(self, port=0):
+        self._server = _Server(('127.0.0.1', port), _Handler)
+        self._server.mock = self
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self):
+        with self._lock:
+            return {'connections': self.connections, 'requests': self.requests,
+                    'bytesSent': self.bytesSent, 'failures': self.failures}
+
+    def resetCounts(self):
+        with self._lock:
+            self.connections = 0
+            self.requests = 0
+            self.bytesSent = 0
+            self.failures = 0
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def _failure(self):
+        with self._lock:
+            if self._random.random() >= self.failureRate:
+                return None
+            self.failures += 1
+            return self._random.choice(['busy', 'drop'])
+
+
+class MockHyliaProcess(object):
+    """A MockHylia running in a process of its own, so that it doesn't
+    count towards the memory use or compete for the GIL with whatever's
+    being benchmarked. Takes the same arguments and has the same properties
+    as MockHylia (except `searchResults`, which is left as the default).
+    """
+
+    def __init__(self, **kwargs):
+        self._arguments = []
+        for name, value in sorted(kwargs.items()):
+            if isinstance(value, (list, tuple, set)):
+                value = ','.join(str(item) for item in sorted(value))
+            if value is not None:
+                self._arguments.extend(['--' + name, str(value)])
+        self._process = None
+        self.baseUrl = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def __getattr__(self, name):
+        if name in {'connections', 'requests', 'bytesSent', 'failures'}:
+            return self.stats()[name]
+        raise AttributeError(name)
+
+    def start(self):
+        self._process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__)] + self._arguments,
+            stdout=subprocess.PIPE, universal_newlines=True)
+        self.baseUrl = self._process.stdout.readline().strip()
+
+    def stop(self):
+        self._process.terminate()
+        self._process.wait()
+        self._process.stdout.close()
+
+    def stats(self):
+        return json.loads(urlopen(self.baseUrl + '_stats').read().decode('utf-8'))
+
+    def resetCounts(self):
+        urlopen(self.baseUrl + '_reset').read()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Run a stand-in for The Hylia locally.")
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--trackCount', type=int, default=20)
+    parser.add_argument('--fileSize', type=int, default=64 * 1024)
+    parser.add_argument('--searchPageSize', type=int)
+    parser.add_argument('--catalogueSize', type=int, default=100)
+    parser.add_argument('--connectLatency', type=float, default=0.0)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--bandwidth', type=float)
+    parser.add_argument('--failureRate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--oddTracks', type=lambda numbers: [int(n) for n in numbers.split(',') if n])
+    parser.add_argument('--oddStatus', type=int, default=404)
+    arguments = vars(parser.parse_args())
+    port = arguments.pop('port')
+
+    mock = MockHylia(**arguments)
+    mock.start(port)
+    print(mock.baseUrl)
+    sys.stdout.flush()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+# Tests for thehylia_async, run against benchmarks/mockhylia.py. Needs
+# Python 3.7+ and aiohttp, like thehylia_async itself.
+
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import thehylia
+from mockhylia import MockHylia
+
+try:
+    import aiohttp
+    import thehylia_async
+except ImportError:
+    thehylia_async = None
+
+
+@unittest.skipIf(thehylia_async is None, "thehylia_async needs aiohttp.")
+class AsyncTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.original = (thehylia.BASE_URL, thehylia.TRIES, thehylia.BACKOFF_BASE,
+                         thehylia._cache, thehylia._cacheConfigured)
+        self.cache = thehylia.MetadataCache(os.path.join(self.path, 'cache.sqlite'))
+        thehylia.setCache(self.cache)
+
+    def tearDown(self):
+        (thehylia.BASE_URL, thehylia.TRIES, thehylia.BACKOFF_BASE, thehylia._cache,
+         thehylia._cacheConfigured) = self.original
+        self.cache._connection.close()
+        shutil.rmtree(self.path)
+
+    def testSearchPages(self):
+        with MockHylia(searchPageSize=2) as mock:
+            thehylia.BASE_URL = mock.baseUrl
+            soundtracks = asyncio.run(thehylia_async.asyncSearch('album', maxPages=2))
+        self.assertEqual([soundtrack.id for soundtrack in soundtracks],
+                         ['album-1', 'album-2', 'album-3', 'album-4'])
+
+    def testResultCalledNext(self):
+        results = ['next-door-ost', 'album-1', 'album-2']
+        with MockHylia(searchResults=results, searchPageSize=2) as mock:
+            thehylia.BASE_URL = mock.baseUrl
+            soundtracks = asyncio.run(thehylia_async.asyncSearch('album'))
+        self.assertEqual([soundtrack.id for soundtrack in soundtracks], results)
+
+    def testErrorPagesArentScraped(self):
+        # Half the requests fail, with a 503 or a dropped connection.
+        thehylia.TRIES = 20
+        thehylia.BACKOFF_BASE = 0.01
+        with MockHylia(failureRate=0.5) as mock:
+            thehylia.BASE_URL = mock.baseUrl
+            for _ in range(5):
+                self.cache.clear()
+                soundtracks = asyncio.run(thehylia_async.asyncSearch('album'))
+                self.assertEqual(len(soundtracks), 10)
+            self.assertGreater(mock.failures, 0)
+
+    def testMissingFileIsntRetried(self):
+        async def download(file, path):
+            async with thehylia_async.makeSession() as session:
+                return await thehylia_async.friendlyDownloadFile(session, file, path, 1, 1)
+        with MockHylia() as mock:
+            file = thehylia.File(mock.baseUrl + 'nowhere/missing.mp3')
+            self.assertFalse(asyncio.run(download(file, self.path)))
+            self.assertEqual(mock.requests, 1)
+
+    def testRetryAfter(self):
+        thehylia.BACKOFF_BASE = 1000
+        error = aiohttp.ClientResponseError(None, (), status=503, headers={'Retry-After': '3'})
+        self.assertEqual(thehylia_async.retryDelay(0, error), 3)
+        self.assertTrue(thehylia_async.isRetryable(error))
+        error = aiohttp.ClientResponseError(None, (), status=404, headers={})
+        self.assertFalse(thehylia_async.isRetryable(error))
+
+
+if __name__ == '__main__':
+    unittest.main()
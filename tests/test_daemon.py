@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+# Tests for what DownloadDaemon takes over HTTP.
+
+from __future__ import unicode_literals
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import thehylia
+
+
+class DaemonHandlerTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.output = os.path.join(self.path, 'output')
+        jobs = thehylia.JobQueue(os.path.join(self.path, 'jobs.sqlite'))
+        self.daemon = thehylia.DownloadDaemon(jobs, output=self.output)
+        self.server = thehylia._makeDaemonServer(('127.0.0.1', 0), self.daemon)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = 'http://127.0.0.1:{}/jobs'.format(self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.path)
+
+    def post(self, request, contentType='application/json'):
+        return thehylia.requests.post(self.url, data=json.dumps(request),
+                                      headers={'Content-Type': contentType},
+                                      timeout=thehylia.TIMEOUT)
+
+    def testSubmit(self):
+        response = self.post({'soundtrack': 'album-1', 'path': 'somewhere'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['path'],
+                         os.path.join(os.path.realpath(self.output), 'somewhere'))
+        response = self.post({'soundtrack': 'album-2', 'site': 'thehylia'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['path'],
+                         os.path.join(os.path.realpath(self.output), 'album-2'))
+
+    def testOnlyJson(self):
+        response = self.post({'soundtrack': 'album-1'}, 'text/plain')
+        self.assertEqual(response.status_code, 415)
+        self.assertEqual(self.daemon.jobs.jobs(), [])
+
+    def testOnlyKnownSites(self):
+        response = self.post({'soundtrack': 'album-1', 'site': 'http://127.0.0.1:9/'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.daemon.jobs.jobs(), [])
+
+    def testOnlyInOutput(self):
+        for request in ({'soundtrack': 'album-1', 'path': os.path.join(self.path, 'elsewhere')},
+                        {'soundtrack': 'album-1', 'path': '../elsewhere'},
+                        {'soundtrack': '../elsewhere'}):
+            response = self.post(request)
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.daemon.jobs.jobs(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
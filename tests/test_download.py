@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+# Tests for downloading files, run against benchmarks/mockhylia.py.
+
+from __future__ import unicode_literals
+
+import hashlib
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import thehylia
+from mockhylia import MockHylia, fileContent, imageFilename, oddFilename, songFilename
+
+
+class DownloadFileTest(unittest.TestCase):
+    def testOwnSessionFailing(self):
+        # In a fresh interpreter, so that thehylia hasn't touched requests
+        # before the download fails. Nothing's listening on port 9.
+        script = '\n'.join([
+            "import sys, tempfile",
+            "import requests",
+            "import thehylia",
+            "thehylia.TRIES = 2",
+            "thehylia.setSession(requests.Session())",
+            "file = thehylia.File('http://127.0.0.1:9/x.mp3')",
+            "sys.exit(thehylia.friendlyDownloadFile(file, tempfile.mkdtemp(), 1, 1))",
+        ])
+        self.assertEqual(subprocess.call([sys.executable, '-c', script], cwd=ROOT), 0)
+
+
+class ResumeTest(unittest.TestCase):
+    # Picking up .part files where they left off.
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.filePath = os.path.join(self.path, 'song.mp3')
+        self.partPath = self.filePath + thehylia.PART_SUFFIX
+        self.original = thehylia.getSession()
+
+    def tearDown(self):
+        thehylia.setSession(self.original)
+        shutil.rmtree(self.path)
+
+    def download(self, part, validator=None):
+        with open(self.partPath, 'wb') as partFile:
+            partFile.write(part)
+        if validator is not None:
+            with open(self.partPath + thehylia.PART_VALIDATOR_SUFFIX, 'w') as validatorFile:
+                validatorFile.write(validator)
+        with MockHylia(fileSize=10000) as mock:
+            urlPath = '/files/album/song.mp3'
+            content = fileContent(urlPath, mock.fileSize)
+            thehylia.File(mock.baseUrl + urlPath[1:]).download(self.filePath)
+            bytesSent = mock.bytesSent
+        with open(self.filePath, 'rb') as downloaded:
+            self.assertEqual(downloaded.read(), content)
+        self.assertEqual(os.listdir(self.path), ['song.mp3'])
+        return content, bytesSent
+
+    def testResume(self):
+        content = fileContent('/files/album/song.mp3', 10000)
+        etag = '"{}"'.format(hashlib.md5(content).hexdigest())
+        _, bytesSent = self.download(content[:4000], etag)
+        self.assertEqual(bytesSent, 6000)
+
+    def testChangedSince(self):
+        _, bytesSent = self.download(b'An older version.', '"older"')
+        self.assertEqual(bytesSent, 10000)
+
+    def testWrongRange(self):
+        # A server that sends a range other than the one asked for.
+        test = self
+        class Session(object):
+            def __init__(self):
+                self.ranges = []
+            def request(self, method, url, **kwargs):
+                rangeHeader = kwargs.get('headers', {}).get('Range')
+                self.ranges.append(rangeHeader)
+                if rangeHeader is not None:
+                    return test.response(206, b'0123456789', {'Content-Range': 'bytes 0-9/10'})
+                return test.response(200, b'0123456789', {})
+        session = Session()
+        thehylia.setSession(session)
+        with open(self.partPath, 'wb') as partFile:
+            partFile.write(b'01234')
+        thehylia.File('http://127.0.0.1:9/song.mp3').download(self.filePath)
+        with open(self.filePath, 'rb') as downloaded:
+            self.assertEqual(downloaded.read(), b'0123456789')
+        self.assertEqual(session.ranges, ['bytes=5-', None])
+
+    def response(self, status, body, headers):
+        response = thehylia.requests.Response()
+        response.status_code = status
+        response.headers.update(headers)
+        response.raw = io.BytesIO(body)
+        return response
+
+
+class InferredFilesTest(unittest.TestCase):
+    # Files worked out from the album page that turn out not to be there.
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.original = (thehylia.BASE_URL, thehylia.FAST_RESOLVE, thehylia._cache,
+                         thehylia._cacheConfigured)
+        thehylia.FAST_RESOLVE = True
+        thehylia.setCache(None)
+
+    def tearDown(self):
+        (thehylia.BASE_URL, thehylia.FAST_RESOLVE, thehylia._cache,
+         thehylia._cacheConfigured) = self.original
+        shutil.rmtree(self.path)
+
+    def download(self, oddStatus):
+        with MockHylia(trackCount=10, oddTracks=[4, 7], oddStatus=oddStatus) as mock:
+            thehylia.BASE_URL = mock.baseUrl
+            soundtrack = thehylia.Soundtrack('album')
+            self.assertTrue(soundtrack.download(self.path, formatOrder=['mp3'], workers=4))
+        expected = [oddFilename(number) if number in (4, 7) else songFilename(number)
+                    for number in range(1, 11)]
+        expected += [imageFilename(1), imageFilename(2)]
+        self.assertEqual(sorted(os.listdir(self.path)), sorted(expected))
+        self.assertEqual(os.path.getsize(os.path.join(self.path, oddFilename(4))), mock.fileSize)
+        inferred = [song.inferred for song in soundtrack.songs]
+        self.assertEqual(inferred, [number not in (1, 4, 7) for number in range(1, 11)])
+
+    def testMissing(self):
+        self.download(404)
+
+    def testWrongSize(self):
+        self.download(200)
+
+
+if __name__ == '__main__':
+    unittest.main()
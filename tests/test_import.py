@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+# Keeps `import thehylia` quick (see benchmarks/bench_import.py).
+
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from bench_import import DEFAULT_BUDGET
+
+# Milliseconds - generous, so that only a real regression (like importing
+# requests up front again) goes over it on a slow or busy machine.
+BUDGET = DEFAULT_BUDGET * 3
+
+
+@unittest.skipIf(sys.version_info < (3, 7), "python -X importtime needs Python 3.7 or newer.")
+class ImportTimeTest(unittest.TestCase):
+    def importTime(self):
+        """Return how many milliseconds `import thehylia` takes in a fresh
+        interpreter, and the names of the modules it imports.
+        """
+        process = subprocess.Popen([sys.executable, '-X', 'importtime', '-c', 'import thehylia'],
+                                   cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   universal_newlines=True)
+        _, output = process.communicate()
+        self.assertEqual(process.returncode, 0, output)
+        total = None
+        modules = set()
+        for line in output.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            _, cumulative, module = line[len('import time:'):].split('|')
+            modules.add(module.strip())
+            if module.strip() == 'thehylia':
+                total = int(cumulative) / 1000
+        return total, modules
+
+    def testLazyImports(self):
+        _, modules = self.importTime()
+        for name in ['requests', 'bs4']:
+            self.assertNotIn(name, modules)
+
+    def testBudget(self):
+        # The best of a few, to allow for the odd slow run.
+        total = min(self.importTime()[0] for _ in range(3))
+        self.assertLessEqual(total, BUDGET)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+# Tests for SoundtrackIndex, run against benchmarks/mockhylia.py.
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import thehylia
+from mockhylia import MockHylia
+
+
+class SoundtrackIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.original = (thehylia.BASE_URL, thehylia._cache, thehylia._cacheConfigured,
+                         thehylia.Site.scrapeListing)
+        thehylia.setCache(None)
+        self.mock = MockHylia(trackCount=2, catalogueSize=30, searchPageSize=10)
+        self.mock.start()
+        thehylia.BASE_URL = self.mock.baseUrl
+        self.index = thehylia.SoundtrackIndex(os.path.join(self.path, 'index.sqlite'))
+        self.assertEqual(self.index.update(), [])
+        self.assertEqual(len(self.index), 30)
+
+    def tearDown(self):
+        (thehylia.BASE_URL, thehylia._cache, thehylia._cacheConfigured,
+         thehylia.Site.scrapeListing) = self.original
+        self.index._connection.close()
+        self.mock.stop()
+        shutil.rmtree(self.path)
+
+    def testTitleCalledNext(self):
+        # A soundtrack whose title starts with "Next" isn't the next page.
+        self.mock.catalogue[0] = 'next-door'
+        self.assertEqual(self.index.update(), [])
+        self.assertEqual(sorted(self.index.ids()), sorted(self.mock.catalogue))
+
+    def testListCutShort(self):
+        # The second page of the list comes back without any soundtracks.
+        scrapeListing = thehylia.Site.scrapeListing
+        def brokenScrapeListing(site, soup):
+            page = scrapeListing(site, soup)
+            if page['soundtracks'][0][0] == 'album-11':
+                page['soundtracks'] = []
+            return page
+        thehylia.Site.scrapeListing = brokenScrapeListing
+        self.index.update()
+        self.assertEqual(len(self.index), 30)
+
+
+if __name__ == '__main__':
+    unittest.main()
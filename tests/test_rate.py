@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+# Tests for rate limiting.
+
+from __future__ import unicode_literals
+
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import thehylia
+
+
+class RateLimitTest(unittest.TestCase):
+    def testNonPositiveLimits(self):
+        for arguments in [(0,), (-1,), (1, 0)]:
+            self.assertRaises(ValueError, thehylia.TokenBucket, *arguments)
+        self.assertRaises(ValueError, thehylia.RateLimiter, hostRequestsPerSecond=0)
+        self.assertRaises(ValueError, thehylia.RateLimiter, bytesPerSecond=-1)
+
+    def testNonPositiveLimitsFromTheCommandLine(self):
+        for arguments in [['--rate', '0'], ['--total-rate', '0'], ['--bandwidth', '0K'],
+                          ['--host-bandwidth', '0']]:
+            process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'thehylia.py')] +
+                                       arguments + ['soundtrack'],
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                       universal_newlines=True)
+            _, error = process.communicate()
+            self.assertEqual(process.returncode, 1)
+            self.assertIn("more than 0", error)
+
+
+if __name__ == '__main__':
+    unittest.main()
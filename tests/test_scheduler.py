@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+# Tests for DownloadScheduler, run against benchmarks/mockhylia.py.
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+try:
+    from urllib.parse import quote
+except ImportError:
+    from urllib import quote
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import thehylia
+from mockhylia import MockHylia, songFilename
+
+
+class DownloadSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.mock = MockHylia(trackCount=10, fileSize=1024)
+        self.mock.start()
+        self.path = tempfile.mkdtemp()
+        self.original = (thehylia.BASE_URL, thehylia.FAST_RESOLVE, thehylia._cache,
+                         thehylia._cacheConfigured, thehylia.Site.scrapeSong)
+        thehylia.BASE_URL = self.mock.baseUrl
+        thehylia.FAST_RESOLVE = False
+        thehylia.setCache(None)
+
+    def tearDown(self):
+        (thehylia.BASE_URL, thehylia.FAST_RESOLVE, thehylia._cache, thehylia._cacheConfigured,
+         thehylia.Site.scrapeSong) = self.original
+        self.mock.stop()
+        shutil.rmtree(self.path)
+
+    def testSongTaskThatRaises(self):
+        scrapeSong = thehylia.Site.scrapeSong
+        brokenUrl = 'broken/' + quote(songFilename(5))
+        def brokenScrapeSong(site, soup, song):
+            if song.url.endswith(brokenUrl):
+                raise AttributeError("Broken song page.")
+            return scrapeSong(site, soup, song)
+        thehylia.Site.scrapeSong = brokenScrapeSong
+
+        finished = []
+        scheduler = thehylia.DownloadScheduler(4, onFinished=finished.append)
+        broken = scheduler.add('broken', os.path.join(self.path, 'broken'))
+        fine = scheduler.add('fine', os.path.join(self.path, 'fine'))
+
+        self.assertFalse(scheduler.run())
+        self.assertIsInstance(broken.error, AttributeError)
+        self.assertIsNone(fine.error)
+        self.assertTrue(fine.success)
+        self.assertEqual(sorted(finished, key=id), sorted([broken, fine], key=id))
+
+    def testNoWorkers(self):
+        self.assertRaises(ValueError, thehylia.DownloadScheduler, 0)
+        process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'thehylia.py'),
+                                    '--batch', '-j', '-1', 'album'],
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   universal_newlines=True)
+        _, error = process.communicate()
+        self.assertEqual(process.returncode, 1)
+        self.assertIn("more than 0", error)
+
+    def testNotStarted(self):
+        scheduler = thehylia.DownloadScheduler(1)
+        scheduled = scheduler.add('album', os.path.join(self.path, 'album'))
+        self.assertFalse(scheduled.success)
+
+
+if __name__ == '__main__':
+    unittest.main()
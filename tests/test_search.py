@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+# Tests for searching, run against benchmarks/mockhylia.py.
+
+from __future__ import unicode_literals
+
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import thehylia
+from mockhylia import MockHylia
+
+
+class SearchTest(unittest.TestCase):
+    def setUp(self):
+        self.original = (thehylia.BASE_URL, thehylia._cache, thehylia._cacheConfigured)
+        thehylia.setCache(None)
+
+    def tearDown(self):
+        thehylia.BASE_URL, thehylia._cache, thehylia._cacheConfigured = self.original
+
+    def testResultCalledNext(self):
+        # A result whose title starts with "Next" isn't the next page.
+        results = ['next-door-ost', 'album-1', 'album-2', 'next', 'album-3']
+        for pageSize in [None, 2]:
+            with MockHylia(searchResults=results, searchPageSize=pageSize) as mock:
+                thehylia.BASE_URL = mock.baseUrl
+                soundtracks = thehylia.search('album')
+            self.assertEqual([soundtrack.id for soundtrack in soundtracks], results)
+
+
+if __name__ == '__main__':
+    unittest.main()
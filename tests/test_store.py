@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+# Tests for FileStore, run against benchmarks/mockhylia.py.
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import thehylia
+from mockhylia import MockHylia, songFilename
+
+# A few silent MPEG-1 Layer III frames - enough of an MP3 for mutagen to tag.
+MP3 = (b'\xff\xfb\x90\x64' + b'\x00' * 413) * 10
+
+
+class FileStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.original = (thehylia.BASE_URL, thehylia._cache, thehylia._cacheConfigured,
+                         thehylia.getStore())
+        thehylia.setCache(None)
+        self.store = thehylia.FileStore(os.path.join(self.path, 'store'))
+
+    def tearDown(self):
+        (thehylia.BASE_URL, thehylia._cache, thehylia._cacheConfigured,
+         store) = self.original
+        thehylia.setStore(store)
+        self.store._connection.close()
+        shutil.rmtree(self.path)
+
+    def testFromStore(self):
+        # The same album in a second library comes from the store.
+        thehylia.setStore(self.store)
+        with MockHylia(trackCount=3) as mock:
+            thehylia.BASE_URL = mock.baseUrl
+            first, second = os.path.join(self.path, 'first'), os.path.join(self.path, 'second')
+            self.assertTrue(thehylia.Soundtrack('album').download(first, formatOrder=['mp3']))
+            fileRequests = []
+            def listener(event, info):
+                if event == 'requestEnd' and info['kind'] == 'file':
+                    fileRequests.append(info)
+            thehylia.addListener(listener)
+            try:
+                self.assertTrue(thehylia.Soundtrack('album').download(second, formatOrder=['mp3']))
+            finally:
+                thehylia.removeListener(listener)
+            self.assertEqual(fileRequests, [])
+        for number in range(1, 4):
+            path = os.path.join(second, songFilename(number))
+            self.assertTrue(os.path.samefile(path, os.path.join(first, songFilename(number))))
+            stored = self.store.objectPath(thehylia.fileHash(path))
+            self.assertTrue(os.path.samefile(path, stored))
+            self.assertEqual(os.stat(path).st_nlink, 3)
+
+    @unittest.skipUnless(thehylia.moduleExists('mutagen'), "Tagging needs mutagen.")
+    def testTaggingUnshares(self):
+        album = os.path.join(self.path, 'album')
+        os.makedirs(album)
+        path, otherPath = os.path.join(album, 'song.mp3'), os.path.join(album, 'other.mp3')
+        with open(path, 'wb') as f:
+            f.write(MP3)
+        url = 'http://127.0.0.1:9/song.mp3'
+        sha256 = self.store.add(url, path)
+        self.assertTrue(self.store.link(url, otherPath))
+
+        self.assertTrue(thehylia.tagFile(path, {'title': "Song"}))
+        stored = self.store.objectPath(sha256)
+        self.assertFalse(os.path.samefile(path, stored))
+        self.assertTrue(os.path.samefile(otherPath, stored))
+        self.assertEqual(thehylia.fileHash(stored), sha256)
+        self.assertNotEqual(thehylia.fileHash(path), sha256)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+# Tests for --sync and Manifest, run against benchmarks/mockhylia.py.
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+try:
+    from urllib.parse import quote
+except ImportError:
+    from urllib import quote
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import thehylia
+from mockhylia import MockHylia, fileContent, songFilename
+
+
+class SyncTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.original = (thehylia.BASE_URL, thehylia._cache, thehylia._cacheConfigured)
+        thehylia.setCache(None)
+        self.mock = MockHylia(trackCount=3, fileSize=4096)
+        self.mock.start()
+        thehylia.BASE_URL = self.mock.baseUrl
+        self.download()
+
+    def tearDown(self):
+        thehylia.BASE_URL, thehylia._cache, thehylia._cacheConfigured = self.original
+        self.mock.stop()
+        shutil.rmtree(self.path)
+
+    def download(self):
+        self.assertTrue(thehylia.Soundtrack('album').download(self.path, formatOrder=['mp3'],
+                                                              sync=True))
+
+    def songPath(self, number):
+        return os.path.join(self.path, songFilename(number))
+
+    def testTruncated(self):
+        with open(self.songPath(2), 'r+b') as f:
+            f.truncate(1000)
+        intact = [os.stat(self.songPath(number)) for number in (1, 3)]
+        self.download()
+        with open(self.songPath(2), 'rb') as f:
+            self.assertEqual(f.read(), fileContent('/files/album/' + quote(songFilename(2)),
+                                                   self.mock.fileSize))
+        # Left alone - not even downloaded again to the same place.
+        for number, stat in zip((1, 3), intact):
+            after = os.stat(self.songPath(number))
+            self.assertEqual((after.st_ino, after.st_mtime), (stat.st_ino, stat.st_mtime))
+        self.assertEqual(thehylia.verifyLibrary(self.path), {})
+
+    def testVerify(self):
+        self.assertEqual(thehylia.verifyLibrary(self.path), {})
+        with open(self.songPath(3), 'r+b') as f:
+            f.seek(100)
+            f.write(b'Not what was downloaded.')
+        self.assertEqual(thehylia.verifyLibrary(self.path),
+                         {self.path: [(songFilename(3), "Contents don't match the manifest.")]})
+
+
+if __name__ == '__main__':
+    unittest.main()
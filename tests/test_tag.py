@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+# Tests for tagging songs as they're downloaded, run against
+# benchmarks/mockhylia.py. Needs mutagen, like tagging itself.
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import thehylia
+from mockhylia import MockHylia, songFilename
+
+
+@unittest.skipUnless(thehylia.moduleExists('mutagen'), "Tagging needs mutagen.")
+class TagFailureTest(unittest.TestCase):
+    # MockHylia's files aren't really MP3s, so none of them can be tagged.
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.original = (thehylia.BASE_URL, thehylia._cache, thehylia._cacheConfigured)
+        thehylia.setCache(None)
+        self.mock = MockHylia(trackCount=3, fileSize=1024)
+        self.mock.start()
+        thehylia.BASE_URL = self.mock.baseUrl
+
+    def tearDown(self):
+        thehylia.BASE_URL, thehylia._cache, thehylia._cacheConfigured = self.original
+        self.mock.stop()
+        shutil.rmtree(self.path)
+
+    def testScheduler(self):
+        scheduler = thehylia.DownloadScheduler(2)
+        scheduled = scheduler.add('album', self.path, tag=True)
+        self.assertFalse(scheduler.run())
+        self.assertEqual(scheduled.failed, [])
+        self.assertEqual(sorted(scheduled.untagged),
+                         [songFilename(number) for number in range(1, 4)])
+
+    def testSoundtrack(self):
+        self.assertFalse(thehylia.Soundtrack('album').download(self.path, tag=True))
+
+    def testBatch(self):
+        process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'thehylia.py'),
+                                    '--batch', '--tag', '--no-cache', '--output', self.path,
+                                    '--site', self.mock.baseUrl, 'album'],
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   universal_newlines=True)
+        _, error = process.communicate()
+        self.assertEqual(process.returncode, 1)
+        self.assertIn("Couldn't tag {}".format(songFilename(1)), error)
+
+
+if __name__ == '__main__':
+    unittest.main()
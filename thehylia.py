@@ -7,27 +7,66 @@
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import base64
+import hashlib
+import importlib
+import json
 import os
+import random
 import re
+import shutil
+import sqlite3
 import sys
+import threading
+import time
+from collections import namedtuple
 from functools import wraps
 
 try:
     from urllib.parse import unquote, urljoin, urlsplit
 except ImportError: # Python 2
     from urlparse import unquote, urljoin, urlsplit
+try:
+    import queue
+except ImportError: # Python 2
+    import Queue as queue
 
 
-class Silence(object):
-    def __enter__(self):
-        self._stdout = sys.stdout
-        self._stderr = sys.stderr
-        sys.stdout = open(os.devnull, 'w')
-        sys.stderr = open(os.devnull, 'w')
-    
-    def __exit__(self, *_):
-        sys.stdout = self._stdout
-        sys.stderr = self._stderr
+def moduleExists(name):
+    """Return whether the module `name` can be imported, without importing it."""
+    try:
+        from importlib.util import find_spec
+    except ImportError: # Python 2
+        import imp
+        try:
+            imp.find_module(name)
+        except ImportError:
+            return False
+        return True
+    return find_spec(name) is not None
+
+
+class LazyModule(object):
+    """Stands in for the module `name`, which is only imported once one of
+    its attributes is used - so that running the script for something that
+    doesn't need it (like --help) doesn't wait for it to load.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<{}: {}>".format(self.__class__.__name__, self._name)
+
+    def __getattr__(self, attribute):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
 
 
 # --- Install prerequisites ---
@@ -36,24 +75,16 @@ class Silence(object):
 # rest of the module, and doesn't even run if the module isn't run by itself.)
 
 if __name__ == '__main__':
-    import imp # To check modules without importing them.
-
     # User-friendly name, import name, pip specification.
     requiredModules = [
         ['requests', 'requests', 'requests >= 2.0.0, < 3.0.0'],
         ['Beautiful Soup 4', 'bs4', 'beautifulsoup4 >= 4.4.0, < 5.0.0']
     ]
 
-    def moduleExists(module):
-        try:
-            imp.find_module(module[1])
-        except ImportError:
-            return False
-        return True
     def neededInstalls(requiredModules=requiredModules):
         uninstalledModules = []
         for module in requiredModules:
-            if not moduleExists(module):
+            if not moduleExists(module[1]):
                 uninstalledModules.append(module)
         return uninstalledModules
 
@@ -87,32 +118,130 @@ if __name__ == '__main__':
 
     needed = neededInstalls()
     if needed:
-        try:
-            imp.find_module('pip')
-        except ImportError:
+        if not moduleExists('pip'):
             print("You don't seem to have pip installed!")
             print("Get it from https://pip.readthedocs.org/en/latest/installing.html")
             sys.exit(1)
-        else:
-            # Needed to call pip the official way.
-            import subprocess
+        # Needed to call pip the official way.
+        import subprocess
 
-    try:
-        installRequiredModules(needed)
-    except OSError:
-        sys.exit(1)
+        try:
+            installRequiredModules(needed)
+        except OSError:
+            sys.exit(1)
 
 # ------
 
-import requests
-from bs4 import BeautifulSoup
+# requests and Beautiful Soup take a while to import, and plenty of things
+# (--help, --status, --offline...) don't need them.
+
+requests = LazyModule('requests')
+bs4 = LazyModule('bs4')
+emailUtils = LazyModule('email.utils') # Only for the odd Retry-After date.
 
 BASE_URL = 'https://anime.thehylia.com/'
 
+# lxml parses a lot faster than Python's own parser, but it's optional.
+PARSER = 'lxml' if moduleExists('lxml') else 'html.parser'
+
+# Everything that's ever scraped is in here, so there's no need to parse
+# the rest of the page. (The arguments for a SoupStrainer - see parseSoup.)
+CONTENT_ONLY = {'id': 'content_container'}
+
+# Errors in The Hylia's HTML: lines with nothing but a stray </td>...
+STRAY_TD_RE = re.compile(br"^</td>\s*$", re.MULTILINE)
+# ... and images linked as <a><div ...><img></a></div>, where the </a>
+# has to be moved after the </div>.
+BAD_DIV_RE = re.compile(br'(<div style="padding: 7px; float: left;">.*?)</a>(.*?</div>)', re.DOTALL)
+# What fixHtml does about them: (regex, replacement) pairs.
+HTML_FIXUPS = [(STRAY_TD_RE, b''), (BAD_DIV_RE, br'\1\2</a>')]
+
 # Although some of these are valid on Linux, keeping this the same
 # across systems is nice for consistency AND it works on WSL.
 FILENAME_INVALID_RE = re.compile(r'[<>:"/\\|?*]')
 
+# Files are downloaded this many bytes at a time, to "<filename>.part".
+CHUNK_SIZE = 64 * 1024
+PART_SUFFIX = '.part'
+# What version of the file a .part file is of (its ETag or Last-Modified)
+# is kept in "<filename>.part.validator", so that resuming it doesn't
+# splice a newer version onto it. See partHeaders.
+PART_VALIDATOR_SUFFIX = '.validator'
+
+# How many times to try downloading a file or page, and how long to wait
+# between tries at most. See retryDelay.
+TRIES = 3
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+# Statuses meaning "slow down", after which it's worth trying again.
+THROTTLED_STATUSES = {429, 503}
+
+# Whether to work out songs' file URLs from the album page where possible,
+# rather than fetching every song's page. See Soundtrack.resolveFiles.
+FAST_RESOLVE = True
+# Sizes in album tables, like "7.12 MB".
+SIZE_RE = re.compile(r'^\s*([0-9.]+)\s*([KMG]?B)\s*$', re.IGNORECASE)
+# How far off (as a fraction, or in bytes for tiny files) a file's size can
+# be from the rounded size on the album page and still be taken for it.
+SIZE_TOLERANCE = 0.05
+SIZE_TOLERANCE_BYTES = 16 * 1024
+
+# Downloaded files are recorded in this file in each directory when syncing.
+# See Manifest.
+MANIFEST_FILENAME = '.thehylia-manifest.json'
+
+# The most connections to have open to any one host at a time, no matter
+# how many workers are downloading.
+MAX_CONNECTIONS_PER_HOST = 4
+
+# Defaults for the shared HTTP session. See makeSession and setSession.
+TIMEOUT = 10
+DEFAULT_HEADERS = {'User-Agent': 'thehylia.py (+https://gitlab.com/RaitaroH/thehylia)'}
+
+_session = None
+_sessionLock = threading.Lock()
+
+# Where and how long to cache info about soundtracks. See MetadataCache.
+CACHE_PATH = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+                          'thehylia', 'metadata.sqlite')
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+# How long to trust cached album and song pages before checking for changes...
+ALBUM_TTL = 24 * 60 * 60
+# ... and search results, which change more often.
+SEARCH_TTL = 60 * 60
+
+# Where to keep the local index of every soundtrack. See SoundtrackIndex.
+INDEX_PATH = os.path.join(os.path.dirname(CACHE_PATH), 'index.sqlite')
+# The site's list of every soundtrack, page by page.
+LISTING_PATH = 'soundtracks/browse/all'
+
+# Where the daemon keeps its jobs, and where it listens. See DownloadDaemon.
+JOBS_PATH = os.path.join(os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share'),
+                         'thehylia', 'jobs.sqlite')
+DAEMON_PORT = 8421
+
+# How many files to tag at once, apart from the download workers. See Tagger.
+TAG_WORKERS = 2
+# Words in the filenames of images that are likely the front cover, most
+# likely first. See coverImage.
+COVER_WORDS = ['cover', 'front', 'folder']
+
+_cache = None
+_cacheConfigured = False
+_cacheLock = threading.Lock()
+
+_rateLimiter = None
+_rateLimiterLock = threading.Lock()
+
+_store = None
+
+_listeners = []
+_listenersLock = threading.Lock()
+
+_printLock = threading.Lock()
+_hostSemaphores = {}
+_hostSemaphoresLock = threading.Lock()
+
 
 # Different printin' for different Pythons.
 def unicodePrint(*args, **kwargs):
@@ -123,7 +252,338 @@ def unicodePrint(*args, **kwargs):
         if isinstance(arg, unicodeType) else arg
         for arg in args
     ]
-    print(*args, **kwargs)
+    # Whole lines only, even when several workers are printing.
+    with _printLock:
+        print(*args, **kwargs)
+
+
+def makeSession(poolSize=MAX_CONNECTIONS_PER_HOST, headers=None):
+    """Return a requests.Session that keeps up to `poolSize` connections
+    per host alive for reuse, sending DEFAULT_HEADERS updated with `headers`
+    along with every request.
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=poolSize, pool_maxsize=poolSize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    session.headers.update(headers or {})
+    return session
+
+
+def getSession():
+    """Return the session all requests go through, making it if needed."""
+    global _session
+    with _sessionLock:
+        if _session is None:
+            _session = makeSession()
+        return _session
+
+
+def setSession(session):
+    """Make all requests go through `session` from now on.
+
+    `session` should be a requests.Session, or at least have the same
+    `request`, `get` and `head` methods. Set it to None to go back to a
+    default one from makeSession.
+    """
+    global _session
+    with _sessionLock:
+        _session = session
+
+
+def getCache():
+    """Return the MetadataCache scraped info is cached in, or None if
+    caching is turned off. Unless setCache has been called, this is a
+    cache at CACHE_PATH - or None if that can't be opened.
+    """
+    global _cache, _cacheConfigured
+    with _cacheLock:
+        if not _cacheConfigured:
+            try:
+                _cache = MetadataCache()
+            except (sqlite3.Error, OSError, IOError):
+                _cache = None
+            _cacheConfigured = True
+        return _cache
+
+
+def setCache(cache):
+    """Cache scraped info in the MetadataCache `cache` from now on, or
+    don't cache anything if it's None.
+    """
+    global _cache, _cacheConfigured
+    with _cacheLock:
+        _cache = cache
+        _cacheConfigured = True
+
+
+def getRateLimiter():
+    """Return the RateLimiter all requests go through. Unless setRateLimiter
+    has been called, it doesn't limit anything.
+    """
+    global _rateLimiter
+    with _rateLimiterLock:
+        if _rateLimiter is None:
+            _rateLimiter = RateLimiter()
+        return _rateLimiter
+
+
+def setRateLimiter(rateLimiter):
+    """Make all requests go through the RateLimiter `rateLimiter` from now
+    on, or through none at all if it's None.
+    """
+    global _rateLimiter
+    with _rateLimiterLock:
+        _rateLimiter = rateLimiter or RateLimiter()
+
+
+def getStore():
+    """Return the FileStore downloaded files are kept in, or None if
+    there isn't one (which is the default).
+    """
+    return _store
+
+
+def setStore(store):
+    """Keep downloaded files in the FileStore `store` from now on, so that
+    files that are in it already aren't downloaded again - or stop, if
+    it's None.
+    """
+    global _store
+    _store = store
+
+
+def httpGet(url, **kwargs):
+    """Like requests.get, but through the shared session (see getSession),
+    timing out after TIMEOUT seconds unless told otherwise, limited by the
+    rate limiter (see getRateLimiter), and reported to listeners (see
+    addListener).
+
+    With stream=True, the response's body isn't counted towards the
+    bandwidth limit - count it with countTransfer as it's read.
+    """
+    response = _request('GET', url, **kwargs)
+    if not kwargs.get('stream'):
+        countTransfer(url, len(response.content))
+    return response
+
+
+def httpHead(url, **kwargs):
+    """Like httpGet, but a HEAD request."""
+    return _request('HEAD', url, **kwargs)
+
+
+def _request(method, url, **kwargs):
+    kwargs.setdefault('timeout', TIMEOUT)
+    getRateLimiter().request(url)
+    kind = 'head' if method == 'HEAD' else 'file' if kwargs.get('stream') else 'page'
+    emit('requestStart', url=url, method=method, kind=kind)
+    start = time.time()
+    try:
+        response = getSession().request(method, url, **kwargs)
+    except Exception as e:
+        emit('requestEnd', url=url, method=method, kind=kind, status=None,
+             seconds=time.time() - start, error=e)
+        raise
+    emit('requestEnd', url=url, method=method, kind=kind, status=response.status_code,
+         seconds=time.time() - start, error=None)
+    return response
+
+
+def countTransfer(url, size):
+    """Count `size` bytes downloaded from `url` towards the bandwidth limit
+    (waiting if need be) and report them to listeners.
+    """
+    getRateLimiter().transfer(url, size)
+    emit('transfer', url=url, bytes=size)
+
+
+def addListener(listener):
+    """Call `listener(event, info)` whenever something happens from now on,
+    where `event` is one of these names and `info` a dict of details:
+
+    * 'requestStart': A request is about to be made.
+                      (url, method, kind - 'page', 'file' or 'head')
+    * 'requestEnd':   A request has been answered, or failed to be.
+                      (url, method, kind, status, seconds, error)
+    * 'transfer':     Some bytes of a page or file have been downloaded.
+                      (url, bytes)
+    * 'retry':        A download or page is about to be tried again.
+                      (url, tries, delay, error)
+    * 'parse':        A page has been parsed and scraped. (url, seconds)
+    * 'fileComplete': friendlyDownloadFile is done with a file. `fromStore`
+                      means it was linked from the FileStore instead of
+                      downloaded. (url, path, success, skipped, fromStore,
+                      seconds)
+    * 'fileTagged':   A Tagger is done with a file. `skipped` means it
+                      was tagged already. (path, success, skipped, seconds)
+
+    Listeners are called from whichever thread the event happened in.
+    """
+    with _listenersLock:
+        _listeners.append(listener)
+
+
+def removeListener(listener):
+    with _listenersLock:
+        _listeners.remove(listener)
+
+
+def emit(event, **info):
+    """Call every listener (see addListener) with `event` and `info`."""
+    for listener in _listeners[:]:
+        listener(event, info)
+
+
+def getPage(url, **kwargs):
+    """Return the response to a GET request for the page at `url` (see
+    httpGet), trying again with backoff (see retryDelay) if the connection
+    fails, the site asks to slow down or it has an error of its own.
+    """
+    for triesElapsed in range(TRIES):
+        try:
+            with hostSlot(url):
+                response = httpGet(url, **kwargs)
+            if isRetryableStatus(response.status_code):
+                response.raise_for_status()
+            return response
+        except downloadErrors() as e:
+            if triesElapsed == TRIES - 1 or not isRetryable(e):
+                raise
+            delay = retryDelay(triesElapsed, e)
+            emit('retry', url=url, tries=triesElapsed + 1, delay=delay, error=e)
+            time.sleep(delay)
+
+
+def downloadErrors():
+    """Return the errors after which a download is worth another try.
+    Partial downloads are kept, so a retry continues from where the last
+    try stopped.
+
+    It's a function so that requests is only imported once it's needed -
+    in an except clause, it's only called once something's been raised.
+    """
+    return (requests.ConnectionError, requests.Timeout, requests.HTTPError,
+            requests.exceptions.ChunkedEncodingError)
+
+
+def isRetryable(error):
+    """Return whether a request that failed with `error` (one of
+    downloadErrors()) is worth trying again.
+    """
+    response = getattr(error, 'response', None)
+    if not isinstance(error, requests.HTTPError) or response is None:
+        return True
+    return isRetryableStatus(response.status_code)
+
+
+def isRetryableStatus(status):
+    """Return whether a response with the HTTP status `status` is an error
+    worth trying again after.
+    """
+    return status >= 500 or status in THROTTLED_STATUSES | {408}
+
+
+def retryDelay(triesElapsed, error=None):
+    """Return how many seconds to wait before trying again after
+    `triesElapsed` failed tries, the last of which failed with `error`.
+
+    If the site said how long to wait (in a Retry-After header), that's how
+    long. Otherwise, it's a random amount of time (so that several workers
+    don't all try again at once) up to twice as long as the last time,
+    starting at BACKOFF_BASE seconds. Never more than BACKOFF_MAX seconds.
+    """
+    response = getattr(error, 'response', None)
+    delay = retryAfter(response.headers) if response is not None else None
+    if delay is not None:
+        return delay
+    return random.uniform(0, min(BACKOFF_BASE * 2 ** triesElapsed, BACKOFF_MAX))
+
+
+def retryAfter(headers):
+    """Return how many seconds the Retry-After header in the response
+    headers `headers` says to wait (no more than BACKOFF_MAX), or None if
+    it doesn't say.
+    """
+    value = headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        delay = float(value)
+    except ValueError: # An HTTP date rather than a number of seconds.
+        date = emailUtils.parsedate_tz(value)
+        if date is None:
+            return None
+        delay = emailUtils.mktime_tz(date) - time.time()
+    return min(max(delay, 0), BACKOFF_MAX)
+
+
+def replaceFile(source, destination):
+    """Rename `source` to `destination`, overwriting it if it exists."""
+    try:
+        os.replace(source, destination)
+    except AttributeError: # Python 2
+        if os.name == 'nt' and os.path.exists(destination):
+            os.remove(destination)
+        os.rename(source, destination)
+
+
+def hostSlot(url):
+    """Return a semaphore that limits the number of simultaneous
+    connections to the host of `url` to MAX_CONNECTIONS_PER_HOST.
+    """
+    host = urlsplit(url).netloc.lower()
+    with _hostSemaphoresLock:
+        if host not in _hostSemaphores:
+            _hostSemaphores[host] = threading.BoundedSemaphore(MAX_CONNECTIONS_PER_HOST)
+        return _hostSemaphores[host]
+
+
+def parallelMap(func, items, workers=1):
+    """Return `[func(item) for item in items]`, calling `func` from up to
+    `workers` threads at once. The results are in the same order as `items`.
+
+    If `func` raises an exception, no new items are started and the
+    exception is re-raised once the running ones have finished.
+    """
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    results = [None] * len(items)
+    errors = []
+    indices = queue.Queue()
+    for i in range(len(items)):
+        indices.put(i)
+
+    def work():
+        while not errors:
+            try:
+                i = indices.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                results[i] = func(items[i])
+            except BaseException as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=work) for _ in range(min(workers, len(items)))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    try:
+        for thread in threads:
+            # Joining with a timeout keeps Ctrl+C working on Python 2.
+            while thread.is_alive():
+                thread.join(0.1)
+    except KeyboardInterrupt:
+        errors.append(KeyboardInterrupt())
+        raise
+
+    if errors:
+        raise errors[0]
+    return results
 
 
 def lazyProperty(func):
@@ -137,81 +597,1136 @@ def lazyProperty(func):
     return lazyVersion
 
 
-def getSoup(*args, **kwargs):
-    r = requests.get(*args, **kwargs)
-    content = r.content
+def getSoup(url, parseOnly=CONTENT_ONLY, **kwargs):
+    r = getPage(url, **kwargs)
+    return parseSoup(r.content, parseOnly)
 
-    # Fix errors in The Hylia's HTML
-    removeRe = re.compile(br"^</td>\s*$", re.MULTILINE)
-    content = removeRe.sub(b'', content)
-    
-    badDivTag = b'<div style="padding: 7px; float: left;">'
-    badDivLength = len(badDivTag)
-    badDivStart = content.find(badDivTag)
-    while badDivStart != -1:
-        badAEnd = content.find(b'</a>', badDivStart)
-        content = content[:badAEnd] + content[badAEnd + 4:]
-        
-        badDivEnd = content.find(b'</div>', badDivStart)
-        content = content[:badDivEnd + 6] + b'</a>' + content[badDivEnd + 6:]
-        
-        badDivStart = content.find(badDivTag, badDivStart + badDivLength)
-    
-    # BS4 outputs unsuppressable error messages when it can't
-    # decode the input bytes properly. This... suppresses them.
-    with Silence():
-        return BeautifulSoup(content, 'html.parser')
+
+_bs4Quieted = False
+
+def parseSoup(content, parseOnly=CONTENT_ONLY, fixups=HTML_FIXUPS):
+    """Parse the HTML bytes `content` (fixing broken markup with `fixups` -
+    see fixHtml) into a BeautifulSoup. Only the parts of the page matching
+    the SoupStrainer `parseOnly` (or a dict of arguments for one) are
+    parsed - pass None for the whole page.
+    """
+    global _bs4Quieted
+    if not _bs4Quieted:
+        # BS4 logs a warning when it can't decode the input bytes properly,
+        # which gets printed if logging isn't set up. The page can be
+        # scraped all the same, so this quiets it - unless logging is set up.
+        import logging
+        logging.getLogger('bs4').addHandler(logging.NullHandler())
+        _bs4Quieted = True
+    if isinstance(parseOnly, dict):
+        parseOnly = bs4.SoupStrainer(**parseOnly)
+    content = fixHtml(content, fixups)
+    return bs4.BeautifulSoup(content, PARSER, parse_only=parseOnly)
+
+
+def fixHtml(content, fixups=HTML_FIXUPS):
+    """Return the HTML bytes `content` with the errors in a site's markup
+    fixed, going by `fixups`: (regex, replacement) pairs, each substituted
+    all through the page in one go. The default is for The Hylia.
+    """
+    for regex, replacement in fixups:
+        content = regex.sub(replacement, content)
+    return content
+
+
+def cachedScrape(url, scrape, ttl, params=None, site=None):
+    """Return `scrape(soup)` for the page at `url` (with the query
+    parameters `params`), using the metadata cache (see getCache) if there
+    is one. `scrape` must return something JSON-serializable. The page is
+    parsed the way the Site `site` (THE_HYLIA by default) needs.
+
+    Cached values younger than `ttl` seconds are used as they are - set it
+    to None to use them no matter how old they are. Older ones are only
+    used if the site says the page hasn't changed since (using ETag or
+    Last-Modified headers), and are otherwise scraped and cached anew.
+
+    Return a tuple of the value and whether it came from the cache.
+    """
+    cache = getCache()
+    key = cacheKey(url, params)
+    entry = cache.get(key) if cache is not None else None
+    if entry is not None and (ttl is None or entry.age < ttl):
+        return entry.value, True
+
+    headers = revalidationHeaders(entry)
+    response = getPage(url, params=params, headers=headers)
+    if entry is not None and headers and response.status_code == 304:
+        cache.touch(key)
+        return entry.value, True
+
+    start = time.time()
+    value = scrape((site or THE_HYLIA).parseSoup(response.content))
+    emit('parse', url=url, seconds=time.time() - start)
+    if cache is not None:
+        cache.set(key, value,
+                  response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    return value, False
+
+
+def cacheKey(url, params=None):
+    """Return the key for the page at `url` with the query parameters
+    `params` in the metadata cache.
+    """
+    return requests.Request('GET', url, params=params).prepare().url
+
+
+def revalidationHeaders(entry):
+    """Return the headers with which to ask whether the page the
+    CacheEntry `entry` was scraped from has changed."""
+    headers = {}
+    if entry is not None:
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.lastModified:
+            headers['If-Modified-Since'] = entry.lastModified
+    return headers
 
 
 def getAppropriateFile(song, formatOrder):
-    if formatOrder is None:
-        return song.files[0]
-    
-    for extension in formatOrder:
-        for file in song.files:
-            if os.path.splitext(file.filename)[1][1:].lower() == extension:
-                return file
+    if formatOrder is not None:
+        filesByFormat = song.filesByFormat
+        for extension in formatOrder:
+            if extension in filesByFormat:
+                return filesByFormat[extension]
     
     return song.files[0]
 
 
-def friendlyDownloadFile(file, path, index, total, verbose=False):
-    numberStr = "{}/{}".format(
-        str(index).zfill(len(str(total))),
-        str(total)
-    )
+def getFormatFiles(song, formats=None):
+    """Return a list of (format, File) for each of the formats (file
+    extensions) in `formats` that `song` is available in - or for each
+    format it's available in at all, if `formats` is None.
+    """
+    filesByFormat = song.filesByFormat
+    if formats is None:
+        return [(file.format, file) for file in song.files if filesByFormat[file.format] is file]
+    return [(extension, filesByFormat[extension]) for extension in formats
+            if extension in filesByFormat]
+
+
+def fileStem(url):
+    """Return the last part of `url`'s path, as is, without its extension."""
+    return os.path.splitext(url.rsplit('/', 1)[-1])[0]
+
+
+def fileExtension(url):
+    """Return the extension of the file at `url`, lowercase and without the dot."""
+    return os.path.splitext(url.rsplit('/', 1)[-1])[1][1:].lower()
+
+
+def fileUrlTemplates(songUrl, fileUrls):
+    """Work out how the song page at `songUrl`'s files' URLs, `fileUrls`,
+    are made from it. Return a list of (prefix, suffix) pairs - one per
+    file - that give the URLs when put around a song page's fileStem, or
+    None if they don't follow the song page's URL.
+    """
+    stem = fileStem(songUrl)
+    templates = []
+    for url in fileUrls:
+        directory, filename = url.rsplit('/', 1)
+        if fileStem(filename) != stem:
+            return None
+        templates.append((directory + '/', os.path.splitext(filename)[1]))
+    return templates or None
+
+
+def parseListedSize(size):
+    """Return the number of bytes in a size like "7.12 MB", or None if it
+    isn't one.
+    """
+    m = SIZE_RE.match(size)
+    if m is None:
+        return None
+    try:
+        number = float(m.group(1))
+    except ValueError:
+        return None
+    return int(number * 1024 ** ['B', 'KB', 'MB', 'GB'].index(m.group(2).upper()))
+
+
+def localFilename(file):
+    """Return the name to save `file` as on this system, along with a note
+    to show the user if that's different from its actual name (or "").
+    """
     original_filename = FILENAME_INVALID_RE.sub('-', file.filename)
     encoding = sys.getfilesystemencoding()
     filename = original_filename.encode(encoding, 'replace').decode(encoding)
-    path = os.path.join(path, filename)
 
     byTheWay = ""
     if original_filename != filename:
         byTheWay = " (replaced characters not in the filesystem's \"{}\" encoding)".format(encoding)
+    return filename, byTheWay
+
+
+def progressNumber(index, total):
+    return "{}/{}".format(
+        str(index).zfill(len(str(total))),
+        str(total)
+    )
+
+
+def friendlyDownloadFile(file, path, index, total, verbose=False, manifest=None,
+                         inferred=False):
+    """Download `file` into the directory `path`, unless it's already there,
+    printing progress as file `index` of `total` if `verbose` is True.
+
+    If `manifest` (the Manifest of `path`) is given, files that are already
+    there are only skipped if they're intact and haven't changed on the
+    site according to the manifest, which is updated along the way.
+
+    If `inferred` is True, raise WrongGuessError if the file turns out not
+    to be where its URL says (see downloadWithRetries).
+
+    Return True if the file is there now, False if it couldn't be downloaded.
+    """
+    numberStr = progressNumber(index, total)
+    filename, byTheWay = localFilename(file)
+    path = os.path.join(path, filename)
+
+    remote = None
+    if manifest is None:
+        upToDate = os.path.exists(path)
+    else:
+        try:
+            remote = file.remoteInfo()
+        except downloadErrors():
+            pass # Just go by what's on disk, then.
+        upToDate = manifest.isUpToDate(filename, path, remote)
+        if not upToDate and manifest.hasChanged(filename, remote):
+            # A new version of the file - don't resume the old one.
+            removePart(path + PART_SUFFIX)
     
-    if not os.path.exists(path):
-        if verbose:
-            unicodePrint("Downloading {}: {}{}...".format(numberStr, filename, byTheWay))
-        for triesElapsed in range(3):
-            if verbose and triesElapsed:
-                unicodePrint("Couldn't download {}. Trying again...".format(filename), file=sys.stderr)
-            try:
-                file.download(path)
-            except (requests.ConnectionError, requests.Timeout):
-                pass
-            else:
-                break
+    if not upToDate:
+        store = getStore()
+        start = time.time()
+        fromStore = store is not None and store.link(file.url, path, remote)
+        if fromStore:
+            success = True
+            if verbose:
+                unicodePrint("Linking {}: {}{} from the store.".format(numberStr, filename, byTheWay))
         else:
+            if verbose:
+                unicodePrint("Downloading {}: {}{}...".format(numberStr, filename, byTheWay))
+            success = downloadWithRetries(file, path, verbose, inferred)
+            if success and store is not None:
+                store.add(file.url, path, remote)
+        emit('fileComplete', url=file.url, path=path, success=success, skipped=False,
+             fromStore=fromStore, seconds=time.time() - start)
+        if not success:
             if verbose:
                 unicodePrint("Couldn't download {}. Skipping over.".format(filename), file=sys.stderr)
             return False
+        if manifest is not None:
+            manifest.record(filename, file.url, remote)
     else:
+        emit('fileComplete', url=file.url, path=path, success=True, skipped=True, fromStore=False,
+             seconds=0.0)
         if verbose:
-            unicodePrint("Skipping over {}: {}{}. Already exists.".format(numberStr, filename, byTheWay))
+            unicodePrint("Skipping over {}: {}{}. {}".format(
+                numberStr, filename, byTheWay,
+                "Already exists." if manifest is None else "Up to date."))
+        if manifest is not None and filename not in manifest.files:
+            manifest.record(filename, file.url, remote)
+
+    return True
+
+
+def downloadWithRetries(file, path, verbose=False, inferred=False):
+    """Download `file` to `path`, trying up to TRIES times with backoff in
+    between (see retryDelay). Return whether it was downloaded.
+
+    If `inferred` is True, the file's URL was worked out rather than
+    scraped (see Soundtrack.resolveFiles), so if it isn't there - or isn't
+    the size the album page says - raise WrongGuessError instead.
+    """
+    for triesElapsed in range(TRIES):
+        try:
+            file.download(path)
+            if inferred and not file.isListedSize(os.path.getsize(path)):
+                os.remove(path)
+                raise WrongGuessError(file.url)
+            return True
+        except downloadErrors() as e:
+            if inferred and not isRetryable(e):
+                raise WrongGuessError(file.url)
+            if triesElapsed == TRIES - 1 or not isRetryable(e):
+                return False
+            if verbose:
+                unicodePrint("Couldn't download {}. Trying again...".format(file.filename), file=sys.stderr)
+            delay = retryDelay(triesElapsed, e)
+            emit('retry', url=file.url, tries=triesElapsed + 1, delay=delay, error=e)
+            time.sleep(delay)
+    return False
+
+
+def fileHash(path):
+    """Return the SHA-256 hash of the file at `path`, in hexadecimal."""
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def linkFile(source, destination):
+    """Make `destination` a hard link to the file at `source` - or a copy
+    of it, where hard links can't be made - replacing anything there.
+    """
+    if os.path.exists(destination) and os.path.samefile(source, destination):
+        return
+    temporaryPath = destination + PART_SUFFIX
+    removePart(temporaryPath)
+    try:
+        os.link(source, temporaryPath)
+    except (OSError, AttributeError): # Another filesystem, say, or no os.link at all.
+        shutil.copyfile(source, temporaryPath)
+    replaceFile(temporaryPath, destination)
+
+
+def unshareFile(path):
+    """If the file at `path` is hard-linked to from elsewhere (like a
+    FileStore), make it a copy of its own, so that changing it doesn't
+    change the others.
+    """
+    if os.stat(path).st_nlink > 1:
+        temporaryPath = path + PART_SUFFIX
+        shutil.copyfile(path, temporaryPath)
+        replaceFile(temporaryPath, path)
+
+
+def hasChangedSince(remote, size, etag, lastModified):
+    """Return whether a file whose RemoteInfo on the site is `remote` has
+    changed since it had the size, ETag and Last-Modified header given.
+    Anything that isn't known (is None) is left out of it.
+    """
+    if remote is None:
+        return False
+    return any(new is not None and old is not None and new != old
+               for new, old in ((remote.size, size), (remote.etag, etag),
+                                (remote.lastModified, lastModified)))
+
+
+def removeIfExists(path):
+    try:
+        os.remove(path)
+    except OSError:
+        if os.path.exists(path):
+            raise
+
+
+def partHeaders(partPath):
+    """Return the headers for a request for the rest of the file being
+    downloaded to `partPath`: a Range from where it stopped, and an
+    If-Range so that the whole file is sent instead if it's changed since
+    (see savePartValidator). No headers if nothing's been downloaded.
+    """
+    headers = {}
+    if os.path.exists(partPath):
+        headers['Range'] = 'bytes={}-'.format(os.path.getsize(partPath))
+        try:
+            with open(partPath + PART_VALIDATOR_SUFFIX) as validatorFile:
+                validator = validatorFile.read().strip()
+        except (IOError, OSError):
+            validator = None
+        if validator:
+            headers['If-Range'] = validator
+    return headers
+
+
+def savePartValidator(partPath, headers):
+    """Keep what version of the file being downloaded to `partPath` it is,
+    going by the response headers `headers`: its ETag, or Last-Modified if
+    there's no strong ETag (If-Range can't use weak ones).
+    """
+    etag = headers.get('ETag')
+    validator = etag if etag and not etag.startswith('W/') else headers.get('Last-Modified')
+    if validator:
+        with open(partPath + PART_VALIDATOR_SUFFIX, 'w') as validatorFile:
+            validatorFile.write(validator)
+    else:
+        removeIfExists(partPath + PART_VALIDATOR_SUFFIX)
+
+
+def isResumedFrom(headers, partPath):
+    """Return whether a 206 response with the headers `headers` continues
+    the file being downloaded to `partPath` from where it stopped.
+    """
+    m = re.match(r'^\s*bytes\s+(\d+)-', headers.get('Content-Range') or '')
+    return m is not None and int(m.group(1)) == os.path.getsize(partPath)
+
+
+def removePart(partPath):
+    """Remove the partly downloaded file at `partPath`, if there is one."""
+    removeIfExists(partPath)
+    removeIfExists(partPath + PART_VALIDATOR_SUFFIX)
+
+
+class TokenBucket(object):
+    """Lets through `rate` units (requests, bytes, ...) per second on
+    average, in bursts of up to `burst` units (by default, one second's
+    worth). Taking more than there is makes you wait until there's enough.
+    Both have to be more than 0.
+    """
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0 or (burst is not None and burst <= 0):
+            raise ValueError("A TokenBucket's rate and burst have to be more than 0.")
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self._tokens = self.burst
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def take(self, amount=1):
+        with self._lock:
+            now = time.time()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Going into debt rather than waiting for enough tokens, so
+            # that more than `burst` can be taken at once, and so that
+            # whoever asks first goes first.
+            self._tokens -= amount
+            wait = -self._tokens / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+
+class RateLimiter(object):
+    """Limits how many requests are made and how many bytes are
+    downloaded per second, in total and to any one host. Any limit that's
+    None isn't limited at all; the rest have to be more than 0.
+    """
+
+    def __init__(self, requestsPerSecond=None, bytesPerSecond=None,
+                 hostRequestsPerSecond=None, hostBytesPerSecond=None):
+        for limit in (requestsPerSecond, bytesPerSecond, hostRequestsPerSecond, hostBytesPerSecond):
+            if limit is not None and limit <= 0:
+                raise ValueError("Rate limits have to be more than 0 (or None).")
+        self.requestsPerSecond = requestsPerSecond
+        self.bytesPerSecond = bytesPerSecond
+        self.hostRequestsPerSecond = hostRequestsPerSecond
+        self.hostBytesPerSecond = hostBytesPerSecond
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def request(self, url):
+        """Wait until a request may be made to `url`."""
+        self._take(url, 'requests', self.requestsPerSecond, self.hostRequestsPerSecond, 1)
+
+    def transfer(self, url, size):
+        """Wait until `size` more bytes may be downloaded from `url`."""
+        self._take(url, 'bytes', self.bytesPerSecond, self.hostBytesPerSecond, size)
+
+    def _take(self, url, kind, rate, hostRate, amount):
+        host = urlsplit(url).netloc.lower()
+        for key, keyRate in (((kind, None), rate), ((kind, host), hostRate)):
+            if keyRate is None:
+                continue
+            with self._lock:
+                if key not in self._buckets:
+                    self._buckets[key] = TokenBucket(keyRate)
+                bucket = self._buckets[key]
+            bucket.take(amount)
+
+
+class RunReport(object):
+    """A listener (see addListener) that keeps track of how a run went:
+    requests made, time spent on each part of the job, bytes downloaded,
+    retries and failures. Get it all as a JSON-able dict with summary().
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.requests = {'page': 0, 'file': 0, 'head': 0}
+        self.failedRequests = 0
+        # Seconds spent, summed over threads.
+        self.busy = {'pages': 0.0, 'files': 0.0, 'head': 0.0, 'parsing': 0.0, 'tagging': 0.0}
+        self.bytes = 0
+        self.retries = 0
+        self.files = {'downloaded': 0, 'fromStore': 0, 'skipped': 0, 'failed': 0}
+        self.tags = {'tagged': 0, 'skipped': 0, 'failed': 0}
+        self.failures = []
+        self._lock = threading.Lock()
+
+    def __call__(self, event, info):
+        with self._lock:
+            if event == 'requestEnd':
+                self.requests[info['kind']] += 1
+                if info['kind'] != 'file': # Files are timed as a whole instead.
+                    self.busy['pages' if info['kind'] == 'page' else 'head'] += info['seconds']
+                if info['error'] is not None or info['status'] >= 400:
+                    self.failedRequests += 1
+            elif event == 'transfer':
+                self.bytes += info['bytes']
+            elif event == 'retry':
+                self.retries += 1
+            elif event == 'parse':
+                self.busy['parsing'] += info['seconds']
+            elif event == 'fileComplete':
+                self.busy['files'] += info['seconds']
+                if info['skipped']:
+                    self.files['skipped'] += 1
+                elif info['fromStore']:
+                    self.files['fromStore'] += 1
+                elif info['success']:
+                    self.files['downloaded'] += 1
+                else:
+                    self.files['failed'] += 1
+                    self.failures.append({'url': info['url'], 'path': info['path']})
+            elif event == 'fileTagged':
+                self.busy['tagging'] += info['seconds']
+                if info['skipped']:
+                    self.tags['skipped'] += 1
+                else:
+                    self.tags['tagged' if info['success'] else 'failed'] += 1
+
+    def summary(self):
+        with self._lock:
+            seconds = time.time() - self.started
+            return {
+                'seconds': seconds,
+                'requests': dict(self.requests, failed=self.failedRequests),
+                'busySeconds': dict(self.busy),
+                'bytes': self.bytes,
+                'bytesPerSecond': self.bytes / seconds if seconds else 0,
+                'retries': self.retries,
+                'files': dict(self.files),
+                'tags': dict(self.tags),
+                'failures': list(self.failures)
+            }
+
+
+RemoteInfo = namedtuple('RemoteInfo', ['size', 'etag', 'lastModified'])
+
+
+class Manifest(object):
+    """A record of the files downloaded to the directory `directory`, kept
+    in a MANIFEST_FILENAME file there: each file's URL, size and SHA-256
+    hash, and the ETag and Last-Modified headers it was downloaded with -
+    plus its size and hash after tagging, if it's been tagged (see Tagger).
+
+    With it, files that have been cut short or have changed on the site can
+    be told apart from ones that are fine - cheaply, with only a HEAD
+    request per file, or entirely offline using `verify`.
+
+    Properties:
+    * directory: The directory the manifest is for.
+    * files:     A dict of info about each file, by filename.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, MANIFEST_FILENAME)
+        self.files = {}
+        self._lock = threading.Lock()
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                self.files = json.loads(f.read().decode('utf-8'))['files']
+
+    def __repr__(self):
+        return "<{}: {}>".format(self.__class__.__name__, self.directory)
+
+    def isUpToDate(self, filename, path, remote=None):
+        """Return whether the file `filename`, at `path`, is there in full
+        and matches `remote` (the RemoteInfo of the file on the site, if it
+        could be gotten).
+        """
+        if not os.path.exists(path):
+            return False
+        size = os.path.getsize(path)
+        entry = self.files.get(filename)
+        if entry is None:
+            # Downloaded without a manifest - fine if it's the right size.
+            return remote is not None and remote.size == size
+        return (size in (entry['size'], entry.get('taggedSize')) and
+                not self.hasChanged(filename, remote))
+
+    def hasChanged(self, filename, remote):
+        """Return whether the file `filename` is different on the site
+        (according to its RemoteInfo `remote`) from when it was downloaded.
+        """
+        entry = self.files.get(filename)
+        if entry is None:
+            return False
+        return hasChangedSince(remote, entry['size'], entry['etag'], entry['lastModified'])
+
+    def record(self, filename, url, remote=None):
+        """Record the file `filename`, downloaded from `url`, as it is on
+        disk now, and save the manifest.
+        """
+        path = os.path.join(self.directory, filename)
+        entry = {
+            'url': url,
+            'size': os.path.getsize(path),
+            'sha256': fileHash(path),
+            'etag': remote.etag if remote is not None else None,
+            'lastModified': remote.lastModified if remote is not None else None
+        }
+        with self._lock:
+            self.files[filename] = entry
+            self._save()
+
+    def recordTagged(self, filename):
+        """Record the file `filename` as it is on disk now that it's been
+        tagged, so that it still counts as intact. Files that aren't in the
+        manifest are left out.
+        """
+        path = os.path.join(self.directory, filename)
+        size, sha256 = os.path.getsize(path), fileHash(path)
+        with self._lock:
+            if filename in self.files:
+                self.files[filename].update(taggedSize=size, taggedSha256=sha256)
+                self._save()
+
+    def verify(self):
+        """Check every file in the manifest against what's on disk, without
+        going online. Return a list of (filename, problem) tuples for the
+        ones that are missing, the wrong size, or have the wrong hash.
+        """
+        problems = []
+        for filename, entry in sorted(self.files.items()):
+            path = os.path.join(self.directory, filename)
+            if not os.path.exists(path):
+                problems.append((filename, "Missing."))
+                continue
+            size = os.path.getsize(path)
+            if size == entry.get('taggedSize'):
+                sha256 = entry['taggedSha256']
+            elif size == entry['size']:
+                sha256 = entry['sha256']
+            else:
+                problems.append((filename, "Should be {} bytes, but is {}.".format(
+                    entry['size'], size)))
+                continue
+            if fileHash(path) != sha256:
+                problems.append((filename, "Contents don't match the manifest."))
+        return problems
+
+    def _save(self):
+        temporaryPath = self.path + PART_SUFFIX
+        with open(temporaryPath, 'wb') as f:
+            f.write(json.dumps({'files': self.files}, indent=1, sort_keys=True).encode('utf-8'))
+        replaceFile(temporaryPath, self.path)
+
+
+def verifyLibrary(path):
+    """Verify every downloaded soundtrack with a manifest (see Manifest) in
+    the directory `path` or any directory under it, without going online.
+
+    Return a dict of the problems found (see Manifest.verify) by directory,
+    leaving out the directories that are all fine.
+    """
+    problems = {}
+    for directory, _, filenames in os.walk(path):
+        if MANIFEST_FILENAME in filenames:
+            directoryProblems = Manifest(directory).verify()
+            if directoryProblems:
+                problems[directory] = directoryProblems
+    return problems
+
+
+StoredFile = namedtuple('StoredFile', ['sha256', 'size', 'etag', 'lastModified'])
+
+
+class FileStore(object):
+    """A content-addressed store of downloaded files in the directory
+    `path`, shared by every album downloaded while it's in use (see
+    setStore).
+
+    Each file is kept once, named after its SHA-256 hash, and album
+    directories get hard links to it - or copies, where hard links can't be
+    made. Which URL had which contents is kept in an SQLite database in
+    the store, so a file that's been downloaded before, for whichever album,
+    isn't downloaded again; and files at different URLs with the same
+    contents only take up space once.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+        objects = os.path.join(path, 'objects')
+        if not os.path.isdir(objects):
+            os.makedirs(objects)
+        self._connection = sqlite3.connect(os.path.join(path, 'files.sqlite'),
+                                           check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "url TEXT PRIMARY KEY, sha256 TEXT, size INTEGER, etag TEXT, lastModified TEXT)")
+
+    def __repr__(self):
+        return "<{}: {}>".format(self.__class__.__name__, self.path)
+
+    def objectPath(self, sha256):
+        return os.path.join(self.path, 'objects', sha256[:2], sha256)
+
+    def get(self, url):
+        """Return the StoredFile for the file at `url`, or None if it isn't
+        in the store.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT sha256, size, etag, lastModified FROM files WHERE url = ?",
+                (url,)).fetchone()
+        return StoredFile(*row) if row is not None else None
+
+    def link(self, url, path, remote=None):
+        """Put the stored file from `url` at `path`, if there is one - and
+        it's still the same as on the site, going by its RemoteInfo
+        `remote`, if given. Return whether there was.
+        """
+        stored = self.get(url)
+        if stored is None or hasChangedSince(remote, stored.size, stored.etag,
+                                             stored.lastModified):
+            return False
+        objectPath = self.objectPath(stored.sha256)
+        try:
+            if os.path.getsize(objectPath) != stored.size:
+                return False
+            linkFile(objectPath, path)
+        except EnvironmentError: # Gone from the store since.
+            return False
+        return True
+
+    def add(self, url, path, remote=None):
+        """Add the file at `path`, downloaded from `url`, to the store, and
+        make `path` a link to the stored file. Return its SHA-256 hash.
+        """
+        sha256 = fileHash(path)
+        objectPath = self.objectPath(sha256)
+        with self._lock:
+            if os.path.exists(objectPath):
+                # The same as a file from somewhere else - keep just the one.
+                linkFile(objectPath, path)
+            else:
+                if not os.path.isdir(os.path.dirname(objectPath)):
+                    os.makedirs(os.path.dirname(objectPath))
+                linkFile(path, objectPath)
+            with self._connection:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                    (url, sha256, os.path.getsize(path),
+                     remote.etag if remote is not None else None,
+                     remote.lastModified if remote is not None else None))
+        return sha256
+
+
+def coverImage(images):
+    """Return whichever of `images` (File objects) is most likely the
+    album's front cover, going by COVER_WORDS - or the first one, if none
+    of them say. Return None if there are no images.
+    """
+    for word in COVER_WORDS:
+        for image in images:
+            if word in image.filename.lower():
+                return image
+    return images[0] if images else None
+
 
+def tagFile(path, tags, coverPath=None):
+    """Tag the audio file at `path` with `tags`, a dict of values by their
+    mutagen "easy" names (like 'album', 'title' and 'tracknumber'), and
+    embed the image at `coverPath`, if given, as its front cover. Needs
+    mutagen.
+
+    Only what's missing or different is written. Return whether anything was.
+    """
+    # Imported here, since nothing but tagging needs it.
+    import mutagen
+
+    audio = mutagen.File(path, easy=True)
+    if audio is None:
+        raise ValueError("Don't know how to tag {}.".format(path))
+    if audio.tags is None:
+        audio.add_tags()
+    changed = False
+    for key, value in tags.items():
+        if audio.tags.get(key) != [value]:
+            audio.tags[key] = value
+            changed = True
+    if changed:
+        unshareFile(path)
+        audio.save()
+
+    if coverPath is not None:
+        with open(coverPath, 'rb') as f:
+            changed = _embedCover(path, f.read(), fileExtension(coverPath)) or changed
+    return changed
+
+
+def _embedCover(path, image, extension):
+    import mutagen
+    from mutagen.flac import FLAC, Picture
+    from mutagen.id3 import APIC, ID3
+    from mutagen.mp4 import MP4, MP4Cover
+    from mutagen.ogg import OggFileType
+
+    mime = 'image/png' if extension == 'png' else 'image/jpeg'
+    picture = Picture()
+    picture.type = 3 # Front cover.
+    picture.mime = mime
+    picture.data = image
+
+    audio = mutagen.File(path)
+    if isinstance(audio, FLAC):
+        if any(existing.type == 3 for existing in audio.pictures):
+            return False
+        audio.add_picture(picture)
+    elif isinstance(audio.tags, ID3):
+        if audio.tags.getall('APIC'):
+            return False
+        audio.tags.add(APIC(encoding=3, mime=mime, type=3, desc="Cover", data=image))
+    elif isinstance(audio, MP4):
+        if 'covr' in audio.tags:
+            return False
+        imageFormat = MP4Cover.FORMAT_PNG if extension == 'png' else MP4Cover.FORMAT_JPEG
+        audio.tags['covr'] = [MP4Cover(image, imageFormat)]
+    elif isinstance(audio, OggFileType):
+        if 'metadata_block_picture' in audio.tags:
+            return False
+        audio.tags['metadata_block_picture'] = [base64.b64encode(picture.write()).decode('ascii')]
+    else:
+        return False # Nowhere to put it.
+    unshareFile(path)
+    audio.save()
     return True
 
 
+class Tagger(object):
+    """Tags downloaded songs (see tagFile) with `workers` threads of its
+    own, so that tagging goes on alongside downloading without any download
+    waiting for it. Needs mutagen.
+
+    Add files with `add` as they're downloaded, then call `close` to wait
+    for the rest. Files that are tagged already are left alone.
+
+    Properties:
+    * failed: The paths of the files that couldn't be tagged.
+    """
+
+    def __init__(self, workers=TAG_WORKERS, verbose=False):
+        if not moduleExists('mutagen'):
+            raise ImportError("Tagging needs mutagen (pip install mutagen).")
+        self.verbose = verbose
+        self.failed = []
+        self._queue = queue.Queue()
+        self._threads = [threading.Thread(target=self._work) for _ in range(workers)]
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def __repr__(self):
+        return "<{}: {} waiting>".format(self.__class__.__name__, self._queue.qsize())
+
+    def add(self, path, tags, coverPath=None, manifest=None):
+        """Tag the file at `path` with `tags` and the image at `coverPath`
+        (see tagFile) once a thread is free. If `manifest` (the Manifest of
+        the file's directory) is given, the tagged file is recorded in it.
+        """
+        self._queue.put((path, tags, coverPath, manifest))
+
+    def close(self):
+        """Wait until every file that's been added is tagged, then stop.
+        Return whether they all could be.
+        """
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        return not self.failed
+
+    def _work(self):
+        import mutagen
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            path, tags, coverPath, manifest = item
+            start = time.time()
+            try:
+                changed = tagFile(path, tags, coverPath)
+                if changed and manifest is not None:
+                    manifest.recordTagged(os.path.basename(path))
+                success = True
+            except (mutagen.MutagenError, ValueError, EnvironmentError) as e:
+                changed = success = False
+                self.failed.append(path)
+                if self.verbose:
+                    unicodePrint("Couldn't tag {}: {}".format(os.path.basename(path), e),
+                                 file=sys.stderr)
+            emit('fileTagged', path=path, success=success, skipped=success and not changed,
+                 seconds=time.time() - start)
+
+
+CacheEntry = namedtuple('CacheEntry', ['value', 'etag', 'lastModified', 'age'])
+
+
+class MetadataCache(object):
+    """A persistent cache of info scraped from The Hylia, in an SQLite
+    database at `path`. Values are anything JSON-serializable, and are
+    stored along with the ETag and Last-Modified headers of the page they
+    were scraped from, so that they can be checked for changes cheaply.
+
+    Once the entries take up more than `maxBytes`, the least recently used
+    ones are thrown out.
+
+    Set `refresh` to True to ignore what's already in the cache (while
+    still caching anything new).
+    """
+
+    def __init__(self, path=CACHE_PATH, maxBytes=CACHE_MAX_BYTES, refresh=False):
+        self.path = path
+        self.maxBytes = maxBytes
+        self.refresh = refresh
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT, etag TEXT, lastModified TEXT, "
+                "fetched REAL, used REAL, size INTEGER)")
+
+    def __repr__(self):
+        return "<{}: {}>".format(self.__class__.__name__, self.path)
+
+    def get(self, key):
+        """Return the CacheEntry for `key`, or None if there isn't one."""
+        if self.refresh:
+            return None
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT value, etag, lastModified, fetched FROM entries WHERE key = ?",
+                (key,)).fetchone()
+            if row is None:
+                return None
+            self._connection.execute("UPDATE entries SET used = ? WHERE key = ?", (now, key))
+        value, etag, lastModified, fetched = row
+        return CacheEntry(json.loads(value), etag, lastModified, now - fetched)
+
+    def set(self, key, value, etag=None, lastModified=None):
+        """Cache `value` under `key`, along with the ETag and Last-Modified
+        headers it was scraped with, if any.
+        """
+        value = json.dumps(value)
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, value, etag, lastModified, now, now, len(key) + len(value)))
+            self._evict()
+
+    def touch(self, key):
+        """Mark the entry for `key` as up to date as of now."""
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE entries SET fetched = ?, used = ? WHERE key = ?", (now, now, key))
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM entries")
+
+    def _evict(self):
+        total = self._connection.execute("SELECT TOTAL(size) FROM entries").fetchone()[0]
+        if total <= self.maxBytes:
+            return
+        # Make some room while at it, so as not to do this on every write.
+        excess = total - self.maxBytes * 0.9
+        staleKeys = []
+        for key, size in self._connection.execute("SELECT key, size FROM entries ORDER BY used"):
+            if excess <= 0:
+                break
+            staleKeys.append((key,))
+            excess -= size
+        self._connection.executemany("DELETE FROM entries WHERE key = ?", staleKeys)
+
+
+IndexEntry = namedtuple('IndexEntry', ['id', 'title', 'formats', 'tracks', 'sizes', 'updated'])
+
+
+class SoundtrackIndex(object):
+    """A local index of every soundtrack on the Site `site` (see getSite -
+    The Hylia by default), in an SQLite database at `path` (by default,
+    indexPath(site)), for searching without going online. Fill it in (and
+    keep it up to date) with update().
+
+    Each soundtrack is kept as an IndexEntry: its ID, title, formats,
+    number of tracks, total size of each format in bytes (as listed on the
+    album page), and when it was last indexed.
+    """
+
+    def __init__(self, path=None, site=None):
+        self.site = getSite(site)
+        self.path = path = path or indexPath(self.site)
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS soundtracks ("
+                "id TEXT PRIMARY KEY, title TEXT, formats TEXT, tracks INTEGER, sizes TEXT, "
+                "updated REAL)")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS tokens ("
+                "token TEXT, id TEXT, PRIMARY KEY (token, id))")
+
+    def __repr__(self):
+        return "<{}: {}>".format(self.__class__.__name__, self.path)
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM soundtracks").fetchone()[0]
+
+    def get(self, soundtrackId):
+        """Return the IndexEntry for `soundtrackId`, or None if it isn't indexed."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT * FROM soundtracks WHERE id = ?", (soundtrackId,)).fetchone()
+        return self._entry(row) if row is not None else None
+
+    def search(self, term):
+        """Return a list of Soundtrack objects for the search term `term`,
+        like the site's search, but from the index. Every word in `term`
+        has to start a word in a soundtrack's title or ID for it to match.
+        """
+        return [Soundtrack(entry.id, self.site) for entry in self.searchEntries(term)]
+
+    def searchEntries(self, term):
+        """Like search, but return IndexEntry objects, best matches first."""
+        tokens = set(indexTokens(term))
+        if not tokens:
+            return []
+        with self._lock:
+            matches = None
+            # The most specific words first, as they narrow it down most.
+            for token in sorted(tokens, key=len, reverse=True):
+                ids = {row[0] for row in self._connection.execute(
+                    "SELECT id FROM tokens WHERE token >= ? AND token < ?",
+                    (token, token + '\uffff'))}
+                matches = ids if matches is None else matches & ids
+                if not matches:
+                    return []
+            rows = [self._connection.execute(
+                        "SELECT * FROM soundtracks WHERE id = ?", (soundtrackId,)).fetchone()
+                    for soundtrackId in matches]
+        def rank(entry):
+            # Whole words before prefixes, then alphabetically.
+            words = set(indexTokens(entry.title)) | set(indexTokens(entry.id))
+            return -len(tokens & words), entry.title.lower()
+        return sorted((self._entry(row) for row in rows), key=rank)
+
+    def add(self, soundtrackId, title, formats, tracks, sizes):
+        """Index the soundtrack `soundtrackId`, replacing what was there."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO soundtracks VALUES (?, ?, ?, ?, ?, ?)",
+                (soundtrackId, title, json.dumps(formats), tracks, json.dumps(sizes),
+                 time.time()))
+            self._connection.execute("DELETE FROM tokens WHERE id = ?", (soundtrackId,))
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO tokens VALUES (?, ?)",
+                [(token, soundtrackId)
+                 for token in set(indexTokens(title)) | set(indexTokens(soundtrackId))])
+
+    def remove(self, soundtrackId):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM soundtracks WHERE id = ?", (soundtrackId,))
+            self._connection.execute("DELETE FROM tokens WHERE id = ?", (soundtrackId,))
+
+    def ids(self):
+        with self._lock:
+            return [row[0] for row in self._connection.execute("SELECT id FROM soundtracks")]
+
+    def update(self, workers=4, full=False, verbose=False):
+        """Bring the index up to date with the site's list of soundtracks,
+        using `workers` threads. Only soundtracks that aren't indexed yet
+        have their album pages fetched, unless `full` is True; soundtracks
+        that aren't on the list any more are removed - but only if the whole
+        list was gone through, down to its last page.
+
+        Return the IDs of the soundtracks that couldn't be indexed.
+        """
+        listed = []
+        listedIds = set()
+        complete = False
+        for page in _iterListingPages(site=self.site):
+            if not page['soundtracks']: # Not a page of the list after all.
+                break
+            for soundtrackId, title in page['soundtracks']:
+                if soundtrackId not in listedIds:
+                    listedIds.add(soundtrackId)
+                    listed.append((soundtrackId, title))
+                    if verbose and len(listed) % 500 == 0:
+                        print("Found {} soundtracks...".format(len(listed)))
+            complete = page['nextPage'] is None
+        known = set(self.ids())
+        if complete:
+            for soundtrackId in known - listedIds:
+                self.remove(soundtrackId)
+        elif verbose:
+            unicodePrint("Couldn't get to the end of the list of soundtracks, "
+                         "so none were removed.", file=sys.stderr)
+
+        toIndex = []
+        for soundtrackId, title in listed:
+            entry = self.get(soundtrackId) if soundtrackId in known else None
+            if full or entry is None:
+                toIndex.append((soundtrackId, title))
+            elif entry.title != title: # Renamed - no need to fetch it again for that.
+                self.add(soundtrackId, title, entry.formats, entry.tracks, entry.sizes)
+        if verbose:
+            print("Indexing {} of {} soundtracks...".format(len(toIndex), len(listed)))
+
+        def index(item):
+            soundtrackId, title = item
+            soundtrack = Soundtrack(soundtrackId, self.site)
+            try:
+                info = soundtrack._info
+            except (NonexistentSoundtrackError,) + downloadErrors():
+                if verbose:
+                    unicodePrint("Couldn't index {}.".format(soundtrackId), file=sys.stderr)
+                return soundtrackId
+            sizes = {}
+            for songSizes in info.get('songSizes') or []:
+                for extension, size in songSizes.items():
+                    sizes[extension] = sizes.get(extension, 0) + size
+            self.add(soundtrackId, title, info['availableFormats'], len(info['songs']), sizes)
+            return None
+        return [soundtrackId for soundtrackId in parallelMap(index, toIndex, workers)
+                if soundtrackId is not None]
+
+    @staticmethod
+    def _entry(row):
+        soundtrackId, title, formats, tracks, sizes, updated = row
+        return IndexEntry(soundtrackId, title, json.loads(formats), tracks, json.loads(sizes),
+                          updated)
+
+
+class WrongGuessError(Exception):
+    """A file whose URL was worked out from the album page (see
+    Soundtrack.resolveFiles) isn't there after all.
+    """
+    def __init__(self, url=""):
+        super(WrongGuessError, self).__init__(url)
+        self.url = url
+    def __str__(self):
+        return "The file \"{}\" isn't where it was expected to be.".format(self.url)
+
+
 class NonexistentSoundtrackError(Exception):
     def __init__(self, soundtrackId=""):
         super(NonexistentSoundtrackError, self).__init__(soundtrackId)
@@ -224,20 +1739,228 @@ class NonexistentSoundtrackError(Exception):
         return s
 
 
+class Site(object):
+    """A site to download soundtracks from: where its pages are, and how to
+    scrape them. THE_HYLIA is the default. A sister site that's laid out
+    the same way only needs a Site with its own `baseUrl`; for one that
+    differs more, subclass Site and override what's different.
+
+    Every site shares the one session, cache and rate limiter, so
+    soundtracks from several sites can be downloaded at once - by a
+    DownloadScheduler, say - as long as each Soundtrack is given its site.
+
+    Properties:
+    * name:            A short name for the site, like "thehylia".
+    * baseUrl:         The URL everything on the site is relative to. For
+                       THE_HYLIA, it's whatever BASE_URL is.
+    * albumPath:       Where album pages are - add a soundtrack ID to get one.
+    * searchPath:      Where the search page is...
+    * searchParameter: ... and the query parameter that takes the term.
+    * listingPath:     Where the list of every soundtrack is.
+    * contentOnly:     The part of each page that's scraped (see parseSoup).
+    * fixups:          Fixes for the site's broken HTML (see fixHtml).
+    """
+
+    def __init__(self, name, baseUrl=None, albumPath='soundtracks/album/', searchPath='search',
+                 searchParameter='search', listingPath=LISTING_PATH, contentOnly=CONTENT_ONLY,
+                 fixups=HTML_FIXUPS):
+        self.name = name
+        self._baseUrl = baseUrl
+        self.albumPath = albumPath
+        self.searchPath = searchPath
+        self.searchParameter = searchParameter
+        self.listingPath = listingPath
+        self.contentOnly = contentOnly
+        self.fixups = fixups
+
+    def __repr__(self):
+        return "<{}: {}>".format(self.__class__.__name__, self.name)
+
+    @property
+    def baseUrl(self):
+        return self._baseUrl if self._baseUrl is not None else BASE_URL
+
+    def url(self, path):
+        return urljoin(self.baseUrl, path)
+
+    def albumUrl(self, soundtrackId):
+        return self.url(self.albumPath + soundtrackId)
+
+    def isOn(self, url):
+        """Return whether `url` is on this site."""
+        return urlsplit(url).netloc.lower() == urlsplit(self.baseUrl).netloc.lower()
+
+    def soundtrackIdFromUrl(self, url):
+        """Return the soundtrack ID at the end of the album URL `url`, or
+        None if it isn't an album URL on this site.
+        """
+        albumUrl = urlsplit(self.albumUrl(''))
+        urlRe = re.compile(r"^https?://" + re.escape(albumUrl.netloc) + re.escape(albumUrl.path) +
+                           r"(?P<soundtrack>[^/]+)$",
+                           re.IGNORECASE)
+        m = urlRe.match(url)
+        return m.group('soundtrack') if m is not None else None
+
+    def parseSoup(self, content):
+        return parseSoup(content, self.contentOnly, self.fixups)
+
+    def scrapeAlbum(self, soup, soundtrack):
+        """Return a dict of what Soundtrack needs from its album page."""
+        contentSoup = soup.find(id='content_container')('div')[1].find('div')
+        if contentSoup.find('p', string="No such album"):
+            raise NonexistentSoundtrackError(soundtrack.id)
+
+        table = contentSoup.find('table')
+        header = table.find('tr')
+        headings = [td.get_text(strip=True) for td in header('td')]
+        if headings[0]:
+            formats = ['mp3']
+        else:
+            formats = [s.lower() for s in headings if s not in {"", "Song Name", "Download", "Size"}]
+            formats = formats or ['mp3']
+
+        anchors = table('a')
+        heading = contentSoup.find('h2')
+        return {
+            'title': heading.get_text(strip=True) if heading is not None else None,
+            'availableFormats': formats,
+            'songs': [urljoin(soundtrack.url, a['href']) for a in anchors],
+            'songNames': [a.get_text(strip=True) for a in anchors],
+            # The sizes of each song's files, by format.
+            'songSizes': [self._scrapeSizes(a.find_parent('tr'), headings, formats)
+                          for a in anchors],
+            'images': [urljoin(soundtrack.url, a['href'])
+                       for a in contentSoup('a', target='_blank')]
+        }
+
+    @staticmethod
+    def _scrapeSizes(row, headings, formats):
+        sizes = {}
+        if row is None:
+            return sizes
+        for heading, td in zip(headings, row('td')):
+            heading = heading.lower()
+            if heading == 'size': # Albums that only come in one format.
+                heading = formats[0]
+            size = parseListedSize(td.get_text(strip=True))
+            if heading in formats and size is not None:
+                sizes[heading] = size
+        return sizes
+
+    def scrapeSong(self, soup, song):
+        """Return a dict of what Song needs from its song page."""
+        contentSoup = soup.find(id='content_container')
+
+        infoParagraph = contentSoup.find(
+            lambda tag: tag.name == 'p' and next(tag.stripped_strings) == 'Album name:')
+        strippedStrings = infoParagraph.stripped_strings
+        for s in strippedStrings:
+            if s == 'Song name:':
+                break
+        name = next(strippedStrings)
+
+        table = contentSoup.find('table', class_='blog')
+        anchors = [b.find('a') for b in table('b', string=re.compile(r'^\s*Download to Computer'))]
+        files = [urljoin(song.url, a['href']) for a in anchors]
+
+        return {'name': name, 'files': files}
+
+    def scrapeSearch(self, soup):
+        """Return the soundtrack IDs on a page of search results, and the
+        URL of the next page (or None).
+        """
+        contentSoup = soup.find(id='content_container')
+        headerParagraph = contentSoup.find('p',
+            string=re.compile(r"^Found [0-9]+ matching albums for \".*\"\.$"))
+        if headerParagraph is None: # Not a page of search results at all.
+            return {'soundtracks': [], 'nextPage': None}
+        anchors = headerParagraph.find_next_sibling('p')('a')
+        return {
+            'soundtracks': [a['href'].split('/')[-1] for a in anchors],
+            'nextPage': self._scrapeNextPage(contentSoup, anchors)
+        }
+
+    def scrapeListing(self, soup):
+        """Return the IDs and titles of the soundtracks on a page of the
+        list of every soundtrack, and the URL of the next page (or None).
+        """
+        contentSoup = soup.find(id='content_container')
+        anchors = contentSoup('a', href=re.compile(r"/" + re.escape(self.albumPath) + r"[^/]+/?$"))
+        return {
+            'soundtracks': [[a['href'].rstrip('/').split('/')[-1], a.get_text(strip=True)]
+                            for a in anchors],
+            'nextPage': self._scrapeNextPage(contentSoup, anchors)
+        }
+
+    @staticmethod
+    def _scrapeNextPage(contentSoup, results):
+        # The "Next" link to another page of the same list - not one of the
+        # `results`, whose titles might start with "Next" too.
+        results = {id(a) for a in results}
+        for a in contentSoup('a', href=True, string=re.compile(r"^\s*Next\b", re.IGNORECASE)):
+            if id(a) not in results and re.search(r"(?:^|&)page=", urlsplit(a['href']).query):
+                return a['href']
+        return None
+
+
+THE_HYLIA = Site('thehylia')
+
+# The sites getSite knows by name. Add your own!
+SITES = {THE_HYLIA.name: THE_HYLIA}
+
+
+def getSite(site=None):
+    """Return the Site for `site`, which may be a Site, the name of one in
+    SITES, or the base URL of a site laid out like The Hylia. None means
+    THE_HYLIA.
+    """
+    if site is None:
+        return THE_HYLIA
+    if isinstance(site, Site):
+        return site
+    if site in SITES:
+        return SITES[site]
+    if re.match(r"^https?://", site, re.IGNORECASE):
+        return siteFromUrl(site) or Site(urlsplit(site).netloc.lower(), site)
+    raise ValueError("There's no site called \"{}\".".format(site))
+
+
+def siteFromUrl(url):
+    """Return the Site in SITES that `url` is on, or None if there isn't one."""
+    for site in SITES.values():
+        if site.isOn(url):
+            return site
+    return None
+
+
+def indexPath(site=None):
+    """Return where the SoundtrackIndex of the Site `site` (see getSite)
+    is kept by default: INDEX_PATH for The Hylia, and next to it for others.
+    """
+    site = getSite(site)
+    if site is THE_HYLIA:
+        return INDEX_PATH
+    return os.path.join(os.path.dirname(INDEX_PATH), 'index-{}.sqlite'.format(site.name))
+
+
 class Soundtrack(object):
-    """A The Hylia soundtrack. Initialize with a soundtrack ID.
+    """A soundtrack on The Hylia - or on the Site `site`, if given (see
+    getSite). Initialize with a soundtrack ID.
     
     Properties:
     * id:     The soundtrack's unique ID, used at the end of its URL.
+    * site:   The Site it's on.
     * url:    The full URL of the soundtrack.
+    * title:  The soundtrack's name, as the site has it.
     * availableFormats: A list of the formats the soundtrack is available in.
     * songs:  A list of Song objects representing the songs in the soundtrack.
     * images: A list of File objects representing the images in the soundtrack.
     """
 
-    def __init__(self, soundtrackId):
+    def __init__(self, soundtrackId, site=None):
         self.id = soundtrackId
-        self.url = urljoin(BASE_URL, 'soundtracks/album/' + self.id)
+        self.site = getSite(site)
+        self.url = self.site.albumUrl(self.id)
     
     def __repr__(self):
         return "<{}: {}>".format(self.__class__.__name__, self.id)
@@ -246,40 +1969,87 @@ class Soundtrack(object):
         return hasattr(self, '_lazy_' + property)
 
     @lazyProperty
-    def _contentSoup(self):
-        soup = getSoup(self.url)
-        contentSoup = soup.find(id='content_container')('div')[1].find('div')
-        if contentSoup.find('p', string="No such album"):
-            raise NonexistentSoundtrackError(self.id)
-        return contentSoup
+    def _info(self):
+        info, self._infoUnchanged = cachedScrape(self.url, self._scrape, ALBUM_TTL, site=self.site)
+        return info
+
+    def _scrape(self, soup):
+        return self.site.scrapeAlbum(soup, self)
+
+    @lazyProperty
+    def title(self):
+        # Cached before titles were scraped, if there isn't one.
+        return self._info.get('title') or self.id
 
     @lazyProperty
     def availableFormats(self):
-        table = self._contentSoup.find('table')
-        header = table.find('tr')
-        headings = [td.get_text(strip=True) for td in header('td')]
-        if headings[0]:
-            return ['mp3']
-        formats = [s.lower() for s in headings if s not in {"", "Song Name", "Download", "Size"}]
-        formats = formats or ['mp3']
-        return formats
+        return self._info['availableFormats']
 
     @lazyProperty
     def songs(self):
-        table = self._contentSoup.find('table')
-        anchors = table('a')
-        urls = [a['href'] for a in anchors]
-        songs = [Song(urljoin(self.url, url)) for url in urls]
-        return songs
+        # If the album hasn't changed, neither have its songs, so there's
+        # no need to check their pages for changes either.
+        sizes = self._info.get('songSizes') or [None] * len(self._info['songs'])
+        return [Song(url, trustCache=self._infoUnchanged, sizes=songSizes, site=self.site)
+                for url, songSizes in zip(self._info['songs'], sizes)]
     
     @lazyProperty
     def images(self):
-        anchors = self._contentSoup('a', target='_blank')
-        urls = [a['href'] for a in anchors]
-        images = [File(urljoin(self.url, url)) for url in urls]
-        return images
+        return [File(url) for url in self._info['images']]
+
+    def resolveFiles(self):
+        """Work out every song's files without fetching every song's page,
+        if possible. The Hylia's file URLs tend to follow the song page URLs,
+        so after fetching one song's page to see how, the rest can be made
+        from the album page's song list - and one HEAD request checks that
+        they're really there. Any song whose files turn out not to be there
+        when they're downloaded gets its page fetched after all (see
+        ScheduledSoundtrack).
+
+        Songs whose files can't be worked out this way are left to fetch
+        their own pages as usual. Return whether the files could be worked
+        out from the album page.
+        """
+        songs = self.songs
+        names = self._info.get('songNames')
+        if len(songs) < 2 or names is None: # Nothing to gain, or an old cache entry.
+            return False
+        inferred = [(song, name) for song, name in zip(songs[1:], names[1:])
+                    if not song._isLoaded('_info')]
+        if not inferred:
+            return True
+
+        try:
+            templates = fileUrlTemplates(songs[0].url, songs[0]._info['files'])
+        except downloadErrors():
+            return False
+        if templates is None:
+            return False
+        for song, name in inferred:
+            song._lazy__info = {'name': name,
+                                'files': [prefix + fileStem(song.url) + suffix
+                                          for prefix, suffix in templates]}
+            song.inferred = True
 
-    def download(self, path='', makeDirs=True, formatOrder=None, verbose=False):
+        try:
+            inferred[-1][0].files[0].remoteInfo()
+        except downloadErrors():
+            # Not the pattern after all - back to the song pages.
+            for song, _ in inferred:
+                song.forgetFiles()
+            return False
+        return True
+
+    def isAvailableIn(self, formatOrder):
+        """Return whether the soundtrack is available in any of the formats
+        (file extensions) in `formatOrder`, or in anything at all if it's None.
+        """
+        if not formatOrder:
+            return True
+        return bool(set(self.availableFormats) & {extension.lower() for extension in formatOrder})
+
+    def download(self, path='', makeDirs=True, formatOrder=None, verbose=False, workers=1,
+                 sync=False, allFormats=False, tag=False):
         """Download the soundtrack to the directory specified by `path`!
         
         Create any directories that are missing if `makeDirs` is set to True.
@@ -287,16 +2057,33 @@ class Soundtrack(object):
         Set `formatOrder` to a list of file extensions to specify the order
         in which to prefer file formats. If set to ['flac', 'mp3'], for
         example, FLAC files will be downloaded if available, and otherwise MP3.
+
+        If `allFormats` is True, every format in `formatOrder` (or every
+        format there is, if it's None) is downloaded instead, each into a
+        subdirectory of `path` named after it (like "flac").
         
         Print progress along the way if `verbose` is set to True.
 
-        Return True if all files were downloaded successfully, False if not.
+        Set `workers` to fetch song pages and download files using that many
+        threads at once. No more than MAX_CONNECTIONS_PER_HOST connections
+        are made to any one host regardless.
+
+        If `sync` is True, files that are already there are checked against
+        the directory's Manifest and the site, and downloaded again if
+        they've been cut short or have changed.
+
+        If `tag` is True, songs are tagged with the album's title, their
+        name and track number, and the album's cover as they're downloaded
+        (see Tagger). Needs mutagen.
+
+        Return True if all files were downloaded (and, with `tag`, tagged)
+        successfully, False if not.
         """
         path = os.path.join(os.getcwd(), path)
         path = os.path.abspath(os.path.realpath(path))
         if formatOrder:
             formatOrder = [extension.lower() for extension in formatOrder]
-            if not set(self.availableFormats) & set(formatOrder):
+            if not self.isAvailableIn(formatOrder):
                 if verbose:
                     print("The soundtrack \"{}\" does not seem to be available in {}.".format(
                           self.id,
@@ -305,21 +2092,17 @@ class Soundtrack(object):
 
         if verbose and not self._isLoaded('songs'):
             print("Getting song list...")
-        files = []
-        for song in self.songs:
-            files.append(getAppropriateFile(song, formatOrder))
-        files.extend(self.images)
-        totalFiles = len(files)
-
-        if makeDirs and not os.path.isdir(path):
-            os.makedirs(os.path.abspath(os.path.realpath(path)))
-
-        success = True
-        for fileNumber, file in enumerate(files, 1):
-            if not friendlyDownloadFile(file, path, fileNumber, totalFiles, verbose):
-                success = False
-        
-        return success
+        # Each song is resolved and downloaded in one go, so songs are dealt
+        # with one after the other rather than all of them at each step.
+        tagger = Tagger(verbose=verbose) if tag else None
+        scheduled = ScheduledSoundtrack(self, path, makeDirs, formatOrder, verbose, sync,
+                                        allFormats, tagger)
+        scheduled._prepare()
+        parallelMap(lambda task: task(), scheduled._tasks, workers)
+        if tagger is not None:
+            # The downloads are done, but the last songs may still be being tagged.
+            tagger.close()
+        return scheduled.success
 
 class Song(object):
     """A song on The Hylia.
@@ -329,34 +2112,68 @@ class Song(object):
     * name:  The name of the song.
     * files: A list of the song's files - there may be several if the song
              is available in more than one format.
+
+    * inferred: Whether `name` and `files` were worked out from the album
+                page instead of the song page (see Soundtrack.resolveFiles).
+
+    `sizes`, if given, is a dict of the song's files' sizes in bytes by
+    format, as listed on the album page. `site` is the Site it's on, if
+    it isn't The Hylia.
     """
 
-    def __init__(self, url):
+    # Albums can have hundreds of songs, so no __dict__ for each. Lazy
+    # properties need a slot each, too.
+    __slots__ = ('url', 'site', 'inferred', '_trustCache', '_sizes',
+                 '_lazy__info', '_lazy_name', '_lazy_files', '_lazy_filesByFormat')
+
+    def __init__(self, url, trustCache=False, sizes=None, site=None):
         self.url = url
+        self.site = getSite(site)
+        self.inferred = False
+        self._trustCache = trustCache
+        self._sizes = sizes or {}
     
     def __repr__(self):
         return "<{}: {}>".format(self.__class__.__name__, self.url)
+
+    def _isLoaded(self, property):
+        return hasattr(self, '_lazy_' + property)
     
     @lazyProperty
-    def _soup(self):
-        return getSoup(self.url)
+    def _info(self):
+        info, _ = cachedScrape(self.url, self._scrape, None if self._trustCache else ALBUM_TTL,
+                               site=self.site)
+        return info
+
+    def _scrape(self, soup):
+        return self.site.scrapeSong(soup, self)
+
+    def forgetFiles(self):
+        """Forget the song's name and files, so they're fetched from the
+        song page next time they're needed.
+        """
+        for property in ('_info', 'name', 'files', 'filesByFormat'):
+            if self._isLoaded(property):
+                delattr(self, '_lazy_' + property)
+        self.inferred = False
 
     @lazyProperty
     def name(self):
-        infoParagraph = self._soup.find(id='content_container').find(
-            lambda tag: tag.name == 'p' and next(tag.stripped_strings) == 'Album name:')
-        strippedStrings = infoParagraph.stripped_strings
-        for s in strippedStrings:
-            if s == 'Song name:':
-                break
-        name = next(strippedStrings)
-        return name
+        return self._info['name']
 
     @lazyProperty
     def files(self):
-        table = self._soup.find(id='content_container').find('table', class_='blog')
-        anchors = [b.find('a') for b in table('b', string=re.compile(r'^\s*Download to Computer'))]
-        return [File(urljoin(self.url, a['href'])) for a in anchors]
+        return [File(url, self._sizes.get(fileExtension(url))) for url in self._info['files']]
+
+    @lazyProperty
+    def filesByFormat(self):
+        """A dict of the song's files by format (file extension, lowercase).
+        If there's more than one file in a format, it's the first one.
+        """
+        filesByFormat = {}
+        for file in self.files:
+            filesByFormat.setdefault(file.format, file)
+        return filesByFormat
 
 
 class File(object):
@@ -365,39 +2182,716 @@ class File(object):
     Properties:
     * url:      The full URL of the file.
     * filename: The file's... filename. You got it.
+    * format:   The file's extension, lowercase and without the dot.
+    * size:     The file's size in bytes as listed on the album page
+                (rounded), or None if it's not known.
     """
 
-    def __init__(self, url):
+    __slots__ = ('url', 'filename', 'format', 'size')
+
+    def __init__(self, url, size=None):
         self.url = url
         self.filename = unquote(url.rsplit('/', 1)[-1])
+        self.format = fileExtension(url)
+        self.size = size
 
     def __repr__(self):
         return "<{}: {}>".format(self.__class__.__name__, self.url)
+
+    def isListedSize(self, size):
+        """Return whether `size` (in bytes) is about the file's size as
+        listed on the album page - or True if that isn't known.
+        """
+        if self.size is None:
+            return True
+        return abs(size - self.size) <= max(self.size * SIZE_TOLERANCE, SIZE_TOLERANCE_BYTES)
     
     def download(self, path):
-        """Download the file to `path`."""
-        response = requests.get(self.url, timeout=10)
-        with open(path, 'wb') as outFile:
-            outFile.write(response.content)
+        """Download the file to `path`.
+
+        The file is streamed to `path` + ".part" and only renamed to `path`
+        once it's complete. If a .part file is already there (from an
+        interrupted download, say), the download picks up where it left off
+        - unless the file has changed on the site since.
+        """
+        partPath = path + PART_SUFFIX
+        with hostSlot(self.url):
+            response = self._request(partPath)
+            if response.status_code == 416:
+                response.close()
+                # "bytes */<length>" - if that's the size of the .part file,
+                # it was done downloading already.
+                contentRange = response.headers.get('Content-Range', '')
+                if contentRange.endswith('/{}'.format(os.path.getsize(partPath))):
+                    replaceFile(partPath, path)
+                    removePart(partPath)
+                    return
+                # Otherwise, it can't be resumed.
+                removePart(partPath)
+                response = self._request(partPath)
+            elif response.status_code == 206 and not isResumedFrom(response.headers, partPath):
+                # Not the rest of the file - start over.
+                response.close()
+                removePart(partPath)
+                response = self._request(partPath)
+            try:
+                response.raise_for_status()
+                # Servers that don't do ranges (or whose file has changed,
+                # going by If-Range) send the whole file again.
+                if response.status_code == 206:
+                    mode = 'ab'
+                else:
+                    mode = 'wb'
+                    savePartValidator(partPath, response.headers)
+                with open(partPath, mode) as outFile:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        countTransfer(self.url, len(chunk))
+                        outFile.write(chunk)
+            finally:
+                response.close()
+
+        replaceFile(partPath, path)
+        removePart(partPath)
+
+    def remoteInfo(self):
+        """Return a RemoteInfo with the file's size, ETag and Last-Modified
+        headers on the site (any of which may be None), using a HEAD request.
+        """
+        with hostSlot(self.url):
+            response = httpHead(self.url, allow_redirects=True)
+        response.raise_for_status()
+        size = response.headers.get('Content-Length')
+        return RemoteInfo(int(size) if size is not None else None,
+                          response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+    def _request(self, partPath):
+        return httpGet(self.url, headers=partHeaders(partPath), stream=True)
 
 
-def download(soundtrackId, path='', makeDirs=True, formatOrder=None, verbose=False):
-    """Download the soundtrack with the ID `soundtrackId`.
-    See Soundtrack.download for more information.
+class ScheduledSoundtrack(object):
+    """A soundtrack added to a DownloadScheduler.
+
+    Properties:
+    * soundtrack: The Soundtrack to download.
+    * path:       The directory to download it to.
+    * failed:     The filenames of the files that couldn't be downloaded.
+    * error:      The exception that stopped the soundtrack from being
+                  downloaded at all (like NonexistentSoundtrackError), if any.
+    * untagged:   The filenames of the songs that couldn't be tagged - all
+                  of them, once the tagger's been closed.
+    * success:    Whether it was downloaded (and tagged), every file of it.
+    * started:    Whether downloading has started.
+    * tagger:     The Tagger to tag songs with as they're downloaded, if any.
+    """
+
+    def __init__(self, soundtrack, path, makeDirs=True, formatOrder=None, verbose=False,
+                 sync=False, allFormats=False, tagger=None):
+        self.soundtrack = soundtrack
+        self.path = os.path.abspath(os.path.realpath(os.path.join(os.getcwd(), path)))
+        self.makeDirs = makeDirs
+        self.formatOrder = [extension.lower() for extension in formatOrder] if formatOrder else None
+        self.sync = sync
+        self.allFormats = allFormats
+        self.tagger = tagger
+        self.failed = []
+        self.error = None
+        self.started = False
+        # Manifests (or None, if not syncing) by directory - there's one for
+        # each format with allFormats.
+        self._manifests = {}
+        self._manifestsLock = threading.Lock()
+        self._coverPath = None
+        self._taggedPaths = set() # Given to the tagger - it may be shared.
+        self._running = 0 # Tasks being worked on.
+        # What's left to do for the soundtrack, as functions to call. The
+        # first thing is getting the song list, which decides the rest.
+        self._tasks = [self._prepare]
+        self._verbose = verbose
+
+    def __repr__(self):
+        return "<{}: {}>".format(self.__class__.__name__, self.soundtrack.id)
+
+    @property
+    def success(self):
+        return self.started and self.error is None and not self.failed and not self.untagged
+
+    @property
+    def untagged(self):
+        if self.tagger is None:
+            return []
+        return [os.path.relpath(path, self.path) for path in list(self.tagger.failed)
+                if path in self._taggedPaths]
+
+    def _prepare(self):
+        self.started = True
+        if not self.soundtrack.isAvailableIn(self.formatOrder):
+            raise UnavailableFormatError(self.soundtrack.id, self.formatOrder)
+        
+        songs = self.soundtrack.songs
+        images = self.soundtrack.images
+        total = len(songs) + len(images)
+        if FAST_RESOLVE:
+            self.soundtrack.resolveFiles()
+        if self.makeDirs and not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        cover = coverImage(images) if self.tagger is not None else None
+        if cover is not None:
+            # Every song gets the cover, so it's needed before any of them.
+            self._coverPath = self._download(cover, len(songs) + 1 + images.index(cover), total)
+
+        def songTask(number, song):
+            return lambda: self._downloadSong(song, number, total)
+        def imageTask(number, image):
+            return lambda: self._download(image, number, total)
+        self._tasks = [songTask(number, song) for number, song in enumerate(songs, 1)]
+        self._tasks.extend(imageTask(number, image)
+                           for number, image in enumerate(images, len(songs) + 1)
+                           if image is not cover)
+
+    def _downloadSong(self, song, number, total):
+        try:
+            self._downloadSongFiles(song, number, total)
+        except WrongGuessError:
+            # Its files aren't named like the others' - get its page after all.
+            song.forgetFiles()
+            self._downloadSongFiles(song, number, total)
+
+    def _downloadSongFiles(self, song, number, total):
+        try:
+            if self.allFormats:
+                files = getFormatFiles(song, self.formatOrder)
+            else:
+                files = [(None, getAppropriateFile(song, self.formatOrder))]
+        except downloadErrors():
+            if self._verbose:
+                unicodePrint("Couldn't get song {}/{} of {}. Skipping over.".format(
+                    number, total, self.soundtrack.id), file=sys.stderr)
+            self.failed.append(unquote(song.url.rsplit('/', 1)[-1]))
+        else:
+            for extension, file in files:
+                path = self._download(file, number, total, extension, song.inferred)
+                if path is not None and self.tagger is not None:
+                    self._taggedPaths.add(path)
+                    self.tagger.add(path, self._tags(song, number), self._coverPath,
+                                    self._manifests[os.path.dirname(path)])
+
+    def _tags(self, song, number):
+        return {'album': self.soundtrack.title,
+                'title': song.name,
+                'tracknumber': "{}/{}".format(number, len(self.soundtrack.songs))}
+
+    def _download(self, file, number, total, subdirectory=None, inferred=False):
+        """Download `file` as file `number` of `total`, and return where it
+        ended up - or None if it couldn't be downloaded. See
+        friendlyDownloadFile for `inferred`.
+        """
+        path = os.path.join(self.path, subdirectory) if subdirectory else self.path
+        with self._manifestsLock:
+            if path not in self._manifests:
+                if not os.path.isdir(path):
+                    os.makedirs(path)
+                self._manifests[path] = Manifest(path) if self.sync else None
+        filename = localFilename(file)[0]
+        if not friendlyDownloadFile(file, path, number, total, self._verbose, self._manifests[path],
+                                    inferred):
+            self.failed.append(filename)
+            return None
+        return os.path.join(path, filename)
+
+
+class DownloadScheduler(object):
+    """Downloads several soundtracks at once, sharing `workers` threads
+    between all of them. The soundtracks take turns, so that they all make
+    progress instead of one hogging every worker.
+
+    Add soundtracks with `add`, then call `run`.
+    """
+
+    def __init__(self, workers=4, verbose=False, onFinished=None):
+        if workers < 1:
+            raise ValueError("A DownloadScheduler needs at least 1 worker.")
+        self.workers = workers
+        self.verbose = verbose
+        self.onFinished = onFinished
+        self.soundtracks = []
+        # Soundtracks that have something to do, in the order they get
+        # their turns. A soundtrack whose song list is being fetched is
+        # left out until that's done, since its other tasks depend on it.
+        self._ready = []
+        self._condition = threading.Condition()
+        # Shared by every soundtrack that's tagged, once there is one.
+        self._tagger = None
+        self._running = 0
+        self._forever = False
+        self._stopping = False
+
+    def add(self, soundtrack, path='', makeDirs=True, formatOrder=None, sync=False,
+            allFormats=False, tag=False):
+        """Add `soundtrack` (a Soundtrack or soundtrack ID) to be downloaded
+        to the directory `path`. See Soundtrack.download for the rest.
+        Soundtracks can be added while the scheduler is running, too.
+
+        Return the ScheduledSoundtrack, which will have the results.
+        """
+        if not isinstance(soundtrack, Soundtrack):
+            soundtrack = Soundtrack(soundtrack)
+        with self._condition:
+            if tag and self._tagger is None:
+                self._tagger = Tagger(verbose=self.verbose)
+            scheduled = ScheduledSoundtrack(soundtrack, path, makeDirs, formatOrder, self.verbose,
+                                            sync, allFormats, self._tagger if tag else None)
+            self.soundtracks.append(scheduled)
+            self._ready.append(scheduled)
+            self._condition.notify_all()
+        return scheduled
+
+    def run(self, forever=False):
+        """Download all the soundtracks that have been added.
+
+        If `forever` is True, keep waiting for more to be added (from other
+        threads) until `stop` is called. `onFinished`, if given, is called
+        with each ScheduledSoundtrack once it's done.
+
+        Return True if every file of every soundtrack was downloaded (and
+        tagged, for those that are). The details are in each
+        ScheduledSoundtrack.
+        """
+        self._forever = forever
+        self._stopping = False
+
+        def nextTask():
+            with self._condition:
+                while True:
+                    while (not self._stopping and not self._ready and
+                           (self._running or self._forever)):
+                        self._condition.wait(1)
+                    if self._stopping or not self._ready:
+                        return None, None
+                    scheduled = self._ready.pop(0)
+                    # One that's failed has nothing left to do.
+                    if scheduled._tasks:
+                        break
+                task = scheduled._tasks.pop(0)
+                if task != scheduled._prepare and scheduled._tasks:
+                    self._ready.append(scheduled)
+                self._running += 1
+                scheduled._running += 1
+                return scheduled, task
+
+        def work(_):
+            while True:
+                scheduled, task = nextTask()
+                if task is None:
+                    return
+                try:
+                    task()
+                except Exception as e:
+                    with self._condition:
+                        scheduled.error = e
+                        scheduled._tasks = []
+                        if scheduled in self._ready:
+                            self._ready.remove(scheduled)
+                finally:
+                    with self._condition:
+                        self._running -= 1
+                        scheduled._running -= 1
+                        if task == scheduled._prepare and scheduled._tasks:
+                            self._ready.append(scheduled)
+                        finished = not scheduled._tasks and not scheduled._running
+                        self._condition.notify_all()
+                    if finished and self.onFinished is not None:
+                        self.onFinished(scheduled)
+
+        parallelMap(work, range(self.workers), self.workers)
+        if self._tagger is not None:
+            self._tagger.close()
+            self._tagger = None
+        return all(scheduled.success for scheduled in self.soundtracks)
+
+    def stop(self):
+        """Make `run` return once the tasks being worked on are done."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+
+
+Job = namedtuple('Job', ['id', 'soundtrack', 'path', 'formatOrder', 'sync', 'state', 'error',
+                         'failed', 'added', 'finished', 'site'])
+
+
+class JobQueue(object):
+    """The daemon's download jobs, kept in an SQLite database at `path` so
+    that they survive restarts. Each is a Job, whose `state` is 'queued'
+    until it's 'done' or has 'failed', and whose `site` is the base URL of
+    the site it's from - or None, for The Hylia.
     """
-    return Soundtrack(soundtrackId).download(path, makeDirs, formatOrder, verbose)
 
+    def __init__(self, path=JOBS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, soundtrack TEXT, path TEXT, "
+                "formatOrder TEXT, sync INTEGER, state TEXT, error TEXT, failed TEXT, "
+                "added REAL, finished REAL, site TEXT)")
+            columns = [row[1] for row in self._connection.execute("PRAGMA table_info(jobs)")]
+            if 'site' not in columns: # From before there were other sites.
+                self._connection.execute("ALTER TABLE jobs ADD COLUMN site TEXT")
 
-def search(term):
+    def __repr__(self):
+        return "<{}: {}>".format(self.__class__.__name__, self.path)
+
+    def add(self, soundtrackId, path, formatOrder=None, sync=False, site=None):
+        """Queue up a job and return it."""
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO jobs (soundtrack, path, formatOrder, sync, state, failed, added, site) "
+                "VALUES (?, ?, ?, ?, 'queued', '[]', ?, ?)",
+                (soundtrackId, path, json.dumps(formatOrder), int(sync), time.time(), site))
+            jobId = cursor.lastrowid
+        return self.get(jobId)
+
+    def get(self, jobId):
+        """Return the Job with the ID `jobId`, or None if there isn't one."""
+        with self._lock:
+            row = self._connection.execute("SELECT * FROM jobs WHERE id = ?", (jobId,)).fetchone()
+        return self._job(row) if row is not None else None
+
+    def jobs(self, state=None):
+        """Return every Job (in the state `state`, if given), oldest first."""
+        with self._lock:
+            if state is None:
+                rows = self._connection.execute("SELECT * FROM jobs ORDER BY id").fetchall()
+            else:
+                rows = self._connection.execute(
+                    "SELECT * FROM jobs WHERE state = ? ORDER BY id", (state,)).fetchall()
+        return [self._job(row) for row in rows]
+
+    def finish(self, jobId, error=None, failed=()):
+        """Mark a job as done, or as failed if there's an `error` or any
+        `failed` files.
+        """
+        state = 'failed' if error is not None or failed else 'done'
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE jobs SET state = ?, error = ?, failed = ?, finished = ? WHERE id = ?",
+                (state, error, json.dumps(list(failed)), time.time(), jobId))
+
+    @staticmethod
+    def _job(row):
+        jobId, soundtrack, path, formatOrder, sync, state, error, failed, added, finished, site = row
+        return Job(jobId, soundtrack, path, json.loads(formatOrder), bool(sync), state, error,
+                   json.loads(failed), added, finished, site)
+
+
+class DownloadDaemon(object):
+    """Downloads soundtracks submitted over HTTP (see submitJob), for as
+    long as it runs, sharing one DownloadScheduler with `workers` threads
+    - and one session's connections - between all of them.
+
+    Jobs are kept in `jobs`, a JobQueue, so that any that were queued or
+    half-done when the daemon stopped are picked up again (where they left
+    off) when it starts. Soundtracks are downloaded into their own
+    directories in `output`, or into the directory a job gives - which has
+    to be in `output`, too.
+    """
+
+    def __init__(self, jobs=None, workers=4, output='', host='127.0.0.1', port=DAEMON_PORT,
+                 verbose=False):
+        self.jobs = jobs if jobs is not None else JobQueue()
+        self.output = output
+        self.host = host
+        self.port = port
+        self.scheduler = DownloadScheduler(workers, verbose, onFinished=self._finished)
+        self._scheduled = {}
+        self._scheduledLock = threading.Lock()
+        self._server = None
+
+    def __repr__(self):
+        return "<{}: {}:{}>".format(self.__class__.__name__, self.host, self.port)
+
+    def submit(self, soundtrack, path=None, formatOrder=None, sync=False, site=None):
+        """Queue up `soundtrack` (an ID or URL) from the Site `site` (see
+        getSite - by default, whichever site in SITES the URL is on, or The
+        Hylia) and return its Job. `path` is relative to `output`.
+
+        Raise ValueError if the site is unknown or `path` isn't in `output`.
+        """
+        soundtrack = soundtrackFromUrl(soundtrack, site)
+        path = self._outputPath(path or soundtrack.id)
+        job = self.jobs.add(soundtrack.id, path, formatOrder, sync,
+                            None if soundtrack.site is THE_HYLIA else soundtrack.site.baseUrl)
+        self._schedule(job)
+        return job
+
+    def status(self, job):
+        """Return a JSON-able dict of how `job` is going."""
+        status = job._asdict()
+        with self._scheduledLock:
+            scheduled = self._scheduled.get(job.id)
+        if job.state == 'queued' and scheduled is not None and scheduled.started:
+            status['state'] = 'running'
+            status['tasksLeft'] = len(scheduled._tasks)
+        return status
+
+    def run(self):
+        """Pick up any unfinished jobs, then serve until interrupted."""
+        for job in self.jobs.jobs('queued'):
+            self._schedule(job)
+        thread = threading.Thread(target=self.scheduler.run, args=(True,))
+        thread.daemon = True
+        thread.start()
+
+        self._server = _makeDaemonServer((self.host, self.port), self)
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self.scheduler.stop()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+    def _outputPath(self, path):
+        output = os.path.realpath(os.path.abspath(self.output))
+        path = os.path.realpath(os.path.join(output, path))
+        if path != output and not path.startswith(os.path.join(output, '')):
+            raise ValueError("\"{}\" isn't in the daemon's output directory.".format(path))
+        return path
+
+    def _schedule(self, job):
+        with self._scheduledLock:
+            self._scheduled[job.id] = self.scheduler.add(Soundtrack(job.soundtrack, job.site),
+                                                         job.path, formatOrder=job.formatOrder,
+                                                         sync=job.sync)
+
+    def _finished(self, scheduled):
+        with self._scheduledLock:
+            jobIds = [jobId for jobId, jobScheduled in self._scheduled.items()
+                      if jobScheduled is scheduled]
+            for jobId in jobIds:
+                del self._scheduled[jobId]
+        error = str(scheduled.error) if scheduled.error is not None else None
+        for jobId in jobIds:
+            self.jobs.finish(jobId, error, scheduled.failed)
+
+
+def _makeDaemonServer(address, downloadDaemon):
+    # Imported here, since nothing but the daemon needs them.
+    try:
+        from http.server import BaseHTTPRequestHandler, HTTPServer
+        from socketserver import ThreadingMixIn
+    except ImportError: # Python 2
+        from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+        from SocketServer import ThreadingMixIn
+
+    class Server(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+
+    class Handler(_DaemonHandler, BaseHTTPRequestHandler):
+        pass
+
+    server = Server(address, Handler)
+    server.downloadDaemon = downloadDaemon
+    return server
+
+
+class _DaemonHandler(object):
+    # Mixed into a BaseHTTPRequestHandler by _makeDaemonServer.
+    # POST /jobs with {"soundtrack": ..., "path": ..., "formatOrder": [...],
+    # "sync": ..., "site": ...} queues up a job; GET /jobs and GET /jobs/<ID> tell you
+    # how they're going.
+    #
+    # Anything on this machine can reach the daemon - web pages included -
+    # so jobs have to be sent as application/json (which a page can't do
+    # without the daemon's say-so), only sites in SITES are taken by name,
+    # and paths have to be in the daemon's output directory.
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        daemon = self.server.downloadDaemon
+        parts = self.path.strip('/').split('/')
+        if parts == ['jobs']:
+            self._respond(200, [daemon.status(job) for job in daemon.jobs.jobs()])
+        elif len(parts) == 2 and parts[0] == 'jobs' and parts[1].isdigit():
+            job = daemon.jobs.get(int(parts[1]))
+            if job is None:
+                self._respond(404, {'error': "No such job."})
+            else:
+                self._respond(200, daemon.status(job))
+        else:
+            self._respond(404, {'error': "Not found."})
+
+    def do_POST(self):
+        daemon = self.server.downloadDaemon
+        if self.path.strip('/') != 'jobs':
+            self._respond(404, {'error': "Not found."})
+            return
+        contentType = (self.headers.get('Content-Type') or '').split(';')[0].strip().lower()
+        if contentType != 'application/json':
+            self._respond(415, {'error': "Expected Content-Type: application/json."})
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            request = json.loads(self.rfile.read(length).decode('utf-8'))
+            soundtrack = request['soundtrack']
+        except (ValueError, KeyError, TypeError):
+            self._respond(400, {'error': "Expected a JSON object with a \"soundtrack\"."})
+            return
+        site = request.get('site')
+        if site is not None and site not in list(SITES):
+            self._respond(400, {'error': "There's no site called \"{}\".".format(site)})
+            return
+        try:
+            job = daemon.submit(soundtrack, request.get('path'), request.get('formatOrder'),
+                                bool(request.get('sync')), site)
+        except ValueError as e: # A path outside the output directory.
+            self._respond(400, {'error': str(e)})
+            return
+        self._respond(201, daemon.status(job))
+
+    def _respond(self, status, value):
+        body = json.dumps(value).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def daemonUrl(host='127.0.0.1', port=DAEMON_PORT):
+    return 'http://{}:{}/'.format(host, port)
+
+
+def submitJob(soundtrack, path=None, formatOrder=None, sync=False, host='127.0.0.1',
+              port=DAEMON_PORT, site=None):
+    """Queue up `soundtrack` (an ID or URL) with the DownloadDaemon
+    running at `host`:`port`, and return the job's status as a dict.
+    `site`, if given, is the name of the site it's on, in the daemon's
+    SITES. `path` has to be in the daemon's output directory.
+    """
+    request = {'soundtrack': soundtrack,
+               'path': os.path.abspath(path) if path else None,
+               'formatOrder': formatOrder, 'sync': sync, 'site': site}
+    response = requests.post(urljoin(daemonUrl(host, port), 'jobs'), json=request,
+                             timeout=TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def jobStatus(jobId=None, host='127.0.0.1', port=DAEMON_PORT):
+    """Return the status of the job `jobId`, or a list of every job's status
+    if it's None, from the DownloadDaemon running at `host`:`port`.
+    """
+    path = 'jobs' if jobId is None else 'jobs/{}'.format(jobId)
+    response = requests.get(urljoin(daemonUrl(host, port), path), timeout=TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+class UnavailableFormatError(Exception):
+    def __init__(self, soundtrackId="", formatOrder=None):
+        super(UnavailableFormatError, self).__init__(soundtrackId)
+        self.soundtrackId = soundtrackId
+        self.formatOrder = formatOrder or []
+    def __str__(self):
+        return "The soundtrack \"{}\" does not seem to be available in {}.".format(
+            self.soundtrackId,
+            "that format" if len(self.formatOrder) == 1 else "any of those formats")
+
+
+def soundtrackIdFromUrl(url, site=None):
+    """Return the soundtrack ID at the end of the album URL `url` on the
+    Site `site` (see getSite), or just `url` if it isn't an album URL at all.
+    """
+    soundtrackId = getSite(site).soundtrackIdFromUrl(url)
+    return soundtrackId if soundtrackId is not None else url
+
+
+def soundtrackFromUrl(url, site=None):
+    """Return a Soundtrack for the album URL (or soundtrack ID) `url`, on
+    the Site `site` (see getSite) - or, if that isn't given, on whichever
+    site in SITES the URL is on, or The Hylia.
+    """
+    site = getSite(site) if site is not None else siteFromUrl(url) or THE_HYLIA
+    return Soundtrack(soundtrackIdFromUrl(url, site), site)
+
+
+def download(soundtrackId, path='', makeDirs=True, formatOrder=None, verbose=False, workers=1,
+             sync=False, allFormats=False, tag=False, site=None):
+    """Download the soundtrack with the ID `soundtrackId` (from the Site
+    `site`, if given - see getSite). See Soundtrack.download for more
+    information.
+    """
+    return Soundtrack(soundtrackId, site).download(path, makeDirs, formatOrder, verbose, workers,
+                                                   sync, allFormats, tag)
+
+
+def search(term, site=None):
     """Return a list of Soundtrack objects for the search term `term`."""
-    soup = getSoup(urljoin(BASE_URL, 'search'), params={'search': term})
-    
-    headerParagraph = soup.find(id='content_container').find('p',
-        string=re.compile(r"^Found [0-9]+ matching albums for \".*\"\.$"))
-    anchors = headerParagraph.find_next_sibling('p')('a')
-    soundtrackIds = [a['href'].split('/')[-1] for a in anchors]
+    return list(iterSearch(term, site=site))
 
-    return [Soundtrack(id) for id in soundtrackIds]
+
+def iterSearch(term, maxPages=100, site=None):
+    """Yield a Soundtrack object for each result for the search term
+    `term` on the Site `site` (see getSite), a page of results at a time,
+    going through up to `maxPages` pages of results if there are several.
+    """
+    site = getSite(site)
+    url = site.url(site.searchPath)
+    params = {site.searchParameter: term}
+    seen = set()
+    for _ in range(maxPages):
+        page, _ = cachedScrape(url, site.scrapeSearch, SEARCH_TTL, params=params, site=site)
+        for soundtrackId in page['soundtracks']:
+            if soundtrackId not in seen:
+                seen.add(soundtrackId)
+                yield Soundtrack(soundtrackId, site)
+        if page['nextPage'] is None:
+            break
+        url, params = urljoin(url, page['nextPage']), None
+
+
+def iterListing(maxPages=10000, site=None):
+    """Yield the ID and title of every soundtrack on the Site `site` (see
+    getSite), going through up to `maxPages` pages of its list of
+    soundtracks.
+    """
+    seen = set()
+    for page in _iterListingPages(maxPages, site):
+        for soundtrackId, title in page['soundtracks']:
+            if soundtrackId not in seen:
+                seen.add(soundtrackId)
+                yield soundtrackId, title
+
+
+def _iterListingPages(maxPages=10000, site=None):
+    # What Site.scrapeListing makes of each page of the list of every
+    # soundtrack on `site`, up to the last one or `maxPages` of them.
+    site = getSite(site)
+    url = site.url(site.listingPath)
+    for _ in range(maxPages):
+        page, _ = cachedScrape(url, site.scrapeListing, SEARCH_TTL, site=site)
+        yield page
+        if page['nextPage'] is None:
+            break
+        url = urljoin(url, page['nextPage'])
+
+
+def indexTokens(text):
+    """Split `text` into the lowercase words SoundtrackIndex searches by."""
+    return re.findall(r"[^\W_]+", text.lower(), re.UNICODE)
 
 # --- And now for the execution. ---
 
@@ -409,6 +2903,10 @@ if __name__ == '__main__':
     # Tiny details!
     class KindArgumentParser(argparse.ArgumentParser):
         def error(self, message):
+            if message.startswith('argument '): # Like "argument --rate: It has to be more than 0."
+                print("{}: {}".format(SCRIPT_NAME, message), file=sys.stderr)
+                print("For detailed help and more options, run \"{} --help\".".format(SCRIPT_NAME), file=sys.stderr)
+                sys.exit(1)
             print("No soundtrack specified! As the first parameter, use the name the soundtrack uses in its URL.", file=sys.stderr)
             print("If you want to, you can also specify an output directory as the second parameter.", file=sys.stderr)
             print("You can also search for soundtracks by using your search term as parameter - as long as it's not an existing soundtrack.", file=sys.stderr)
@@ -423,12 +2921,90 @@ if __name__ == '__main__':
                 prefix = 'Usage: '
             return super(ProperHelpFormatter, self).add_usage(usage, actions, groups, prefix)
 
+    def parseSize(size):
+        m = re.match(r"^\s*([0-9.]+)\s*([kmg]?)i?b?\s*$", size, re.IGNORECASE)
+        if m is None:
+            raise argparse.ArgumentTypeError("\"{}\" isn't a size.".format(size))
+        multiplier = 1024 ** ' kmg'.index(m.group(2).lower() or ' ')
+        try:
+            number = float(m.group(1))
+        except ValueError: # Like "1..2".
+            raise argparse.ArgumentTypeError("\"{}\" isn't a size.".format(size))
+        return positiveNumber(number * multiplier)
+
+    def positiveInteger(number):
+        try:
+            number = int(number)
+        except ValueError:
+            raise argparse.ArgumentTypeError("\"{}\" isn't a whole number.".format(number))
+        return int(positiveNumber(number))
+
+    def positiveNumber(number):
+        try:
+            number = float(number)
+        except ValueError:
+            raise argparse.ArgumentTypeError("\"{}\" isn't a number.".format(number))
+        if number <= 0:
+            raise argparse.ArgumentTypeError("It has to be more than 0.")
+        return number
+
+    def printBatchSummary(scheduledSoundtracks):
+        failures = [scheduled for scheduled in scheduledSoundtracks if not scheduled.success]
+        print()
+        print("Downloaded {} of {} soundtracks.".format(
+              len(scheduledSoundtracks) - len(failures), len(scheduledSoundtracks)))
+        if failures:
+            print(file=sys.stderr)
+            print("These weren't fully downloaded:", file=sys.stderr)
+            for scheduled in failures:
+                if scheduled.error is not None:
+                    reason = str(scheduled.error)
+                elif not scheduled.started:
+                    reason = "Never got started."
+                else:
+                    reasons = []
+                    if scheduled.failed:
+                        reasons.append("Couldn't download {}.".format(", ".join(scheduled.failed)))
+                    if scheduled.untagged:
+                        reasons.append("Couldn't tag {}.".format(", ".join(scheduled.untagged)))
+                    reason = " ".join(reasons)
+                unicodePrint("{}: {}".format(scheduled.soundtrack.id, reason), file=sys.stderr)
+
+    def verify(path):
+        problems = verifyLibrary(path)
+        for directory, directoryProblems in sorted(problems.items()):
+            unicodePrint(directory, file=sys.stderr)
+            for filename, problem in directoryProblems:
+                unicodePrint("    {}: {}".format(filename, problem), file=sys.stderr)
+        if problems:
+            print("\nRun with --sync to download the broken files again.", file=sys.stderr)
+            return 1
+        print("Everything's fine!")
+        return 0
+
+    def printJobs(port):
+        try:
+            jobs = jobStatus(port=port)
+        except requests.ConnectionError:
+            print("The daemon doesn't seem to be running (start it with --daemon).", file=sys.stderr)
+            return 1
+        for job in jobs:
+            details = ""
+            if job['error']:
+                details = " - " + job['error']
+            elif job['failed']:
+                details = " - couldn't download {}".format(", ".join(job['failed']))
+            unicodePrint("{:>5} {:<8} {}{}".format(job['id'], job['state'], job['soundtrack'], details))
+        return 0
+
     def doIt(): # Only in a function to be able to stop after errors, really.
+        global TRIES, FAST_RESOLVE
         parser = KindArgumentParser(description="Download entire soundtracks from The Hylia.\n\n"
                                     "Examples:\n"
                                     "%(prog)s jumping-flash\n"
                                     "%(prog)s katamari-forever \"music{}Katamari Forever OST\"\n"
                                     "%(prog)s --search persona\n"
+                                    "%(prog)s --batch --output music persona\n"
                                     "%(prog)s --format flac mother-3".format(os.sep),
                                     epilog="Hope you enjoy the script!",
                                     formatter_class=ProperHelpFormatter,
@@ -440,7 +3016,7 @@ if __name__ == '__main__':
         except AttributeError:
             pass
 
-        parser.add_argument('soundtrack',
+        parser.add_argument('soundtrack', nargs='?',
                             help="The ID of the soundtrack, used at the end of its URL (e.g. \"jumping-flash\").\n"
                             "May also simply be the URL of the soundtrack.\n"
                             "If it doesn't exist (or --search is specified, orrrr too many arguments are supplied),\n"
@@ -452,25 +3028,110 @@ if __name__ == '__main__':
         
         parser.add_argument('-h', '--help', action='help', default=argparse.SUPPRESS,
                             help="Show this help and exit.")
-        parser.add_argument('-f', '--format', default=None, metavar="...",
+        parser.add_argument('-f', '--format', '--formats', default=None, metavar="...",
                             help="The file format in which to download the soundtrack (e.g. \"flac\").\n"
                             "You can also specify a comma-separated list of which formats to try\n"
                             "(for example, \"flac,mp3\": download FLAC if available, otherwise MP3).")
+        parser.add_argument('-a', '--all-formats', action='store_true',
+                            help="Download every format given with --format (or every format there is)\n"
+                            "rather than just one, each into a subdirectory named after it.")
+        parser.add_argument('-t', '--tag', action='store_true',
+                            help="Tag songs with the album's title, their name and track number, and embed\n"
+                            "the album's cover, as they're downloaded. Songs that are tagged already\n"
+                            "are left alone. Needs mutagen (pip install mutagen).")
         parser.add_argument('-s', '--search', action='store_true',
                             help="Always search, regardless of whether the specified soundtrack ID exists or not.")
+        parser.add_argument('-j', '--jobs', type=positiveInteger, default=None, metavar="N",
+                            help="How many songs to fetch and download at once\n"
+                            "(default: 1, or 4 in batch mode).")
+        parser.add_argument('-b', '--batch', action='store_true',
+                            help="Download every soundtrack the search term finds, each into its own directory.")
+        parser.add_argument('--batch-file', metavar="FILE",
+                            help="Download every soundtrack listed in FILE (IDs or URLs, one per line;\n"
+                            "\"-\" reads them from standard input), each into its own directory.")
+        parser.add_argument('-o', '--output', metavar="DIR", default='',
+                            help="In batch mode, the directory to put the soundtracks' directories in.\n"
+                            "Defaults to the current directory.")
+        parser.add_argument('--site', metavar="SITE",
+                            help="The site to use: {}, or the address of another site that's laid out\n"
+                            "like The Hylia. Album URLs of those sites work without it.".format(
+                                ", ".join(sorted(SITES))))
+        parser.add_argument('--offline', action='store_true',
+                            help="Search the local index of soundtracks instead of the site\n"
+                            "(see --update-index).")
+        parser.add_argument('--update-index', action='store_true',
+                            help="Fetch the site's list of soundtracks into the local index for --offline\n"
+                            "(kept in \"{}\") and exit. Only soundtracks that are new since the last\n"
+                            "time are fetched, unless --refresh is given.".format(INDEX_PATH))
+        parser.add_argument('--sync', action='store_true',
+                            help="Check files that are already there against the site, and download them\n"
+                            "again if they've been cut short or have changed. Keeps a manifest of what's\n"
+                            "been downloaded (\"{}\") in the download directory.".format(MANIFEST_FILENAME))
+        parser.add_argument('--store', metavar="DIR",
+                            help="Keep downloaded files in a store in DIR, hard-linked into each download\n"
+                            "directory, so that files that are in it already aren't downloaded again,\n"
+                            "and files that are the same in different albums are only kept once.")
+        parser.add_argument('--daemon', action='store_true',
+                            help="Keep running, downloading soundtracks sent with --submit into their own\n"
+                            "directories in --output. Unfinished jobs are picked up again on restart.")
+        parser.add_argument('--submit', action='store_true',
+                            help="Have the running --daemon download the soundtrack, instead of doing it here.")
+        parser.add_argument('--status', action='store_true',
+                            help="Show how the running --daemon's jobs are going, and exit.")
+        parser.add_argument('--port', type=int, default=DAEMON_PORT, metavar="PORT",
+                            help="The port the daemon listens on, on localhost (default: {}).".format(DAEMON_PORT))
+        parser.add_argument('--verify', metavar="DIR",
+                            help="Check every soundtrack downloaded with --sync in DIR (and any directory\n"
+                            "in it) against its manifest, without going online, and exit.")
+        parser.add_argument('--song-pages', action='store_true',
+                            help="Fetch every song's page to find its files, rather than working them out\n"
+                            "from the album page (slower, but sure to be right).")
+        parser.add_argument('--rate', type=positiveNumber, metavar="N",
+                            help="Make no more than N requests per second to any one site.")
+        parser.add_argument('--total-rate', type=positiveNumber, metavar="N",
+                            help="Make no more than N requests per second in total.")
+        parser.add_argument('--bandwidth', type=parseSize, metavar="BYTES",
+                            help="Download no more than BYTES bytes per second in total\n"
+                            "(e.g. \"500K\" or \"2M\").")
+        parser.add_argument('--host-bandwidth', type=parseSize, metavar="BYTES",
+                            help="Download no more than BYTES bytes per second from any one site.")
+        parser.add_argument('--tries', type=int, default=TRIES, metavar="N",
+                            help="How many times to try downloading a file or page before giving up\n"
+                            "(default: {}). Waits longer and longer between tries.".format(TRIES))
+        parser.add_argument('--no-cache', action='store_true',
+                            help="Don't read or write the cache of album, song and search pages\n"
+                            "(kept in \"{}\").".format(CACHE_PATH))
+        parser.add_argument('--refresh', action='store_true',
+                            help="Ignore the cache and fetch every page anew, updating the cache.")
+        parser.add_argument('--report', metavar="FILE",
+                            help="When done, write a summary of the run to FILE as JSON: requests made,\n"
+                            "time spent fetching, parsing and downloading, bytes, retries and failures.")
 
         arguments = parser.parse_args()
+        if arguments.verify is not None:
+            return verify(arguments.verify)
+        if arguments.status:
+            return printJobs(arguments.port)
+        if (arguments.soundtrack is None and arguments.batch_file is None
+                and not arguments.update_index and not arguments.daemon):
+            parser.error("No soundtrack specified.")
+        try:
+            site = getSite(arguments.site) if arguments.site is not None else None
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 1
+        if arguments.tag and not moduleExists('mutagen'):
+            print("Tagging needs mutagen. Install it with \"pip install mutagen\".", file=sys.stderr)
+            return 1
 
         try:
             soundtrack = arguments.soundtrack.decode(sys.getfilesystemencoding())
-        except AttributeError: # Python 3's argv is in Unicode
-            soundtrack = arguments.soundtrack
+        except AttributeError: # Python 3's argv is in Unicode (or there's no soundtrack)
+            soundtrack = arguments.soundtrack or ''
 
-        urlRe = re.compile(r"^https?://" + urlsplit(BASE_URL).netloc +
-                           r"/soundtracks/album/(?P<soundtrack>[^/]+)$",
-                           re.IGNORECASE)
-        m = urlRe.match(soundtrack)
-        soundtrack = m.group('soundtrack') if m is not None else soundtrack
+        batchSite = site # Unless it's given, each soundtrack in a batch file has its own.
+        site = site or siteFromUrl(soundtrack) or THE_HYLIA
+        soundtrack = soundtrackIdFromUrl(soundtrack, site)
 
         outPath = arguments.outPath if arguments.outPath is not None else soundtrack
 
@@ -486,29 +3147,117 @@ if __name__ == '__main__':
             searchTerm = ' '.join(searchTerm)
         searchTerm = searchTerm.replace('-', ' ')
 
+        TRIES = max(arguments.tries, 1)
+        FAST_RESOLVE = not arguments.song_pages
+        setRateLimiter(RateLimiter(arguments.total_rate, arguments.bandwidth,
+                                   arguments.rate, arguments.host_bandwidth))
+
+        if arguments.store is not None:
+            setStore(FileStore(arguments.store))
+        if arguments.no_cache:
+            setCache(None)
+        elif arguments.refresh and getCache() is not None:
+            getCache().refresh = True
+
+        searchFor = lambda term: iterSearch(term, site=site)
+        if arguments.offline:
+            if not os.path.exists(indexPath(site)):
+                print("There's no local index yet - run with --update-index first.", file=sys.stderr)
+                return 1
+            searchFor = SoundtrackIndex(site=site).search
+
         formatOrder = arguments.format
         if formatOrder:
             formatOrder = re.split(r',\s*', formatOrder)
             formatOrder = [extension.lstrip('.').lower() for extension in formatOrder]
 
+        report = None
+        if arguments.report is not None:
+            report = RunReport()
+            addListener(report)
+
         try:
-            if onlySearch:
-                searchResults = search(searchTerm)
-                if searchResults:
-                    # print("Soundtracks found (to download, "
-                         # "run \"{} soundtrack-name\"):".format(SCRIPT_NAME))
-                    for soundtrack in searchResults:
-                        print(soundtrack.id)
+            if arguments.daemon:
+                # So that jobs can name it.
+                SITES.setdefault(site.name, site)
+                daemon = DownloadDaemon(workers=arguments.jobs or 4, output=arguments.output,
+                                        port=arguments.port, verbose=True)
+                print("Listening on {}".format(daemonUrl(port=arguments.port)))
+                try:
+                    daemon.run()
+                except KeyboardInterrupt:
+                    print("Stopped. Unfinished jobs will be picked up next time.", file=sys.stderr)
+                return 0
+            elif arguments.submit:
+                try:
+                    job = submitJob(soundtrack, arguments.outPath, formatOrder, arguments.sync,
+                                    port=arguments.port,
+                                    site=None if site is THE_HYLIA else site.name)
+                except requests.ConnectionError:
+                    print("The daemon doesn't seem to be running (start it with --daemon).",
+                          file=sys.stderr)
+                    return 1
+                except requests.HTTPError as e:
+                    try:
+                        error = e.response.json()['error']
+                    except (ValueError, KeyError, TypeError):
+                        error = str(e)
+                    unicodePrint("The daemon wouldn't take it: {}".format(error), file=sys.stderr)
+                    return 1
+                unicodePrint("Queued {} as job {}.".format(job['soundtrack'], job['id']))
+            elif arguments.update_index:
+                index = SoundtrackIndex(site=site)
+                failed = index.update(arguments.jobs or 4, full=arguments.refresh, verbose=True)
+                print("{} soundtracks indexed.".format(len(index)))
+                return 1 if failed else 0
+            elif arguments.batch or arguments.batch_file is not None:
+                if arguments.batch_file is not None:
+                    batchFile = sys.stdin if arguments.batch_file == '-' else open(arguments.batch_file)
+                    with batchFile:
+                        soundtracks = [soundtrackFromUrl(line.strip(), batchSite)
+                                       for line in batchFile if line.strip()]
                 else:
+                    soundtracks = list(searchFor(searchTerm))
+                    if not soundtracks:
+                        print("No soundtracks found.")
+                        return 1
+
+                scheduler = DownloadScheduler(arguments.jobs or 4, verbose=True)
+                for soundtrack in soundtracks:
+                    scheduler.add(soundtrack, os.path.join(arguments.output, soundtrack.id),
+                                  formatOrder=formatOrder, sync=arguments.sync,
+                                  allFormats=arguments.all_formats, tag=arguments.tag)
+                try:
+                    success = scheduler.run()
+                except KeyboardInterrupt:
+                    print("Stopped download.", file=sys.stderr)
+                    return 1
+                printBatchSummary(scheduler.soundtracks)
+                return 0 if success else 1
+            elif onlySearch:
+                found = False
+                # print("Soundtracks found (to download, "
+                     # "run \"{} soundtrack-name\"):".format(SCRIPT_NAME))
+                # Printed as soon as they're found, for the benefit of
+                # anything reading the output as it comes (like fzf).
+                for soundtrack in searchFor(searchTerm):
+                    print(soundtrack.id)
+                    sys.stdout.flush()
+                    found = True
+                if not found:
                     print("No soundtracks found.")
             else:
                 try:
-                    success = download(soundtrack, outPath, formatOrder=formatOrder, verbose=True)
+                    success = download(soundtrack, outPath, formatOrder=formatOrder, verbose=True,
+                                       workers=arguments.jobs or 1, sync=arguments.sync,
+                                       allFormats=arguments.all_formats, tag=arguments.tag,
+                                       site=site)
                     if not success:
-                        print("\nNot all files could be downloaded.", file=sys.stderr)
+                        print("\nNot all files could be downloaded{}.".format(
+                              " and tagged" if arguments.tag else ""), file=sys.stderr)
                         return 1
                 except NonexistentSoundtrackError:
-                    searchResults = search(searchTerm)
+                    searchResults = list(searchFor(searchTerm))
                     print("\nThe soundtrack \"{}\" does not seem to exist.".format(soundtrack), file=sys.stderr)
 
                     if searchResults: # aww yeah we gon' do some searchin'
@@ -520,8 +3269,14 @@ if __name__ == '__main__':
                     print("Stopped download.", file=sys.stderr)
                     return 1
         except (requests.ConnectionError, requests.Timeout):
-            print("Could not connect to The Hylia.", file=sys.stderr)
+            print("Could not connect to {}.".format("The Hylia" if site is THE_HYLIA else site.baseUrl),
+                  file=sys.stderr)
             print("Make sure you have a working internet connection.", file=sys.stderr)
+        except requests.HTTPError as e:
+            print("{} answered with an error ({}).".format(
+                  "The Hylia" if site is THE_HYLIA else site.baseUrl, e.response.status_code),
+                  file=sys.stderr)
+            print("It may be having trouble - try again later.", file=sys.stderr)
         except Exception:
             print(file=sys.stderr)
             print("An unexpected error occurred! "
@@ -531,6 +3286,10 @@ if __name__ == '__main__':
             print("Attach the following error message:", file=sys.stderr)
             print(file=sys.stderr)
             raise
+        finally:
+            if report is not None:
+                with open(arguments.report, 'w') as reportFile:
+                    json.dump(report.summary(), reportFile, indent=1, sort_keys=True)
         
         return 0
     
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+
+# Asynchronous counterparts to thehylia's searching, scraping and
+# downloading, for use with asyncio. Needs Python 3.7+ and aiohttp.
+
+import asyncio
+import os
+import sys
+from contextlib import asynccontextmanager
+from urllib.parse import urljoin
+
+import aiohttp
+
+import thehylia
+from thehylia import (ALBUM_TTL, CHUNK_SIZE, MAX_CONNECTIONS_PER_HOST, PART_SUFFIX,
+                      SEARCH_TTL, THE_HYLIA, Soundtrack, cacheKey, getAppropriateFile, getCache,
+                      getSite, isResumedFrom, isRetryableStatus, localFilename, partHeaders,
+                      progressNumber, removePart, replaceFile, retryAfter, revalidationHeaders,
+                      savePartValidator, unicodePrint)
+
+# Errors after which a download is worth another try, like
+# thehylia.downloadErrors().
+DOWNLOAD_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+
+def isRetryable(error):
+    """Like thehylia.isRetryable, but for DOWNLOAD_ERRORS."""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return isRetryableStatus(error.status)
+    return True
+
+
+def retryDelay(triesElapsed, error=None):
+    """Like thehylia.retryDelay, but for DOWNLOAD_ERRORS."""
+    headers = getattr(error, 'headers', None)
+    delay = retryAfter(headers) if headers is not None else None
+    return delay if delay is not None else thehylia.retryDelay(triesElapsed)
+
+
+def makeSession(poolSize=MAX_CONNECTIONS_PER_HOST, totalPoolSize=100, headers=None):
+    """Return an aiohttp.ClientSession that keeps connections alive for
+    reuse, with up to `poolSize` at a time to any one host and
+    `totalPoolSize` overall. It sends thehylia.DEFAULT_HEADERS updated with
+    `headers`, and times out like thehylia's requests do.
+
+    Close it when you're done with it (`await session.close()`).
+    """
+    allHeaders = dict(thehylia.DEFAULT_HEADERS)
+    allHeaders.update(headers or {})
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=totalPoolSize, limit_per_host=poolSize),
+        headers=allHeaders,
+        timeout=aiohttp.ClientTimeout(sock_connect=thehylia.TIMEOUT,
+                                      sock_read=thehylia.TIMEOUT))
+
+
+@asynccontextmanager
+async def _sessionOrNew(session):
+    if session is not None:
+        yield session
+    else:
+        async with makeSession() as session:
+            yield session
+
+
+async def getPage(session, url, params=None, headers=None):
+    """Like thehylia.getPage, but through the aiohttp session `session`.
+    Return the response and its body, already read.
+    """
+    for triesElapsed in range(thehylia.TRIES):
+        try:
+            async with session.get(url, params=params, headers=headers) as response:
+                if isRetryableStatus(response.status):
+                    response.raise_for_status()
+                return response, await response.read()
+        except DOWNLOAD_ERRORS as e:
+            if triesElapsed == thehylia.TRIES - 1 or not isRetryable(e):
+                raise
+            await asyncio.sleep(retryDelay(triesElapsed, e))
+
+
+async def cachedScrape(session, url, scrape, ttl, params=None, site=None):
+    """Like thehylia.cachedScrape, but fetching through the aiohttp
+    session `session`. Parsing happens in the default executor, so as not
+    to hold up the event loop.
+    """
+    cache = getCache()
+    key = cacheKey(url, params)
+    entry = cache.get(key) if cache is not None else None
+    if entry is not None and (ttl is None or entry.age < ttl):
+        return entry.value, True
+
+    headers = revalidationHeaders(entry)
+    response, content = await getPage(session, url, params, headers)
+    if entry is not None and headers and response.status == 304:
+        cache.touch(key)
+        return entry.value, True
+
+    loop = asyncio.get_event_loop()
+    parse = (site or THE_HYLIA).parseSoup
+    value = await loop.run_in_executor(None, lambda: scrape(parse(content)))
+    if cache is not None:
+        cache.set(key, value,
+                  response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    return value, False
+
+
+async def asyncSearch(term, session=None, site=None, maxPages=100):
+    """Return a list of Soundtrack objects for the search term `term` on
+    the site `site` (see thehylia.getSite), going through up to `maxPages`
+    pages of results.
+    """
+    site = getSite(site)
+    url = site.url(site.searchPath)
+    params = {site.searchParameter: term}
+    soundtrackIds = []
+    async with _sessionOrNew(session) as session:
+        for _ in range(maxPages):
+            page, _ = await cachedScrape(session, url, site.scrapeSearch,
+                                         SEARCH_TTL, params=params, site=site)
+            soundtrackIds.extend(id for id in page['soundtracks'] if id not in soundtrackIds)
+            if page['nextPage'] is None:
+                break
+            url, params = urljoin(url, page['nextPage']), None
+    return [Soundtrack(id, site) for id in soundtrackIds]
+
+
+async def asyncSongs(soundtrack, session=None, workers=MAX_CONNECTIONS_PER_HOST):
+    """Return `soundtrack.songs`, fetching the album page and then up to
+    `workers` song pages at a time. Afterwards, `availableFormats`,
+    `images`, and every song's `name` and `files` are all loaded, so using
+    them doesn't block.
+    """
+    async with _sessionOrNew(session) as session:
+        # Fill in what Soundtrack's and Song's lazy properties would've
+        # fetched themselves.
+        if not soundtrack._isLoaded('_info'):
+            info, unchanged = await cachedScrape(session, soundtrack.url,
+                                                 soundtrack._scrape, ALBUM_TTL,
+                                                 site=soundtrack.site)
+            soundtrack._infoUnchanged = unchanged
+            soundtrack._lazy__info = info
+        songs = soundtrack.songs
+
+        semaphore = asyncio.Semaphore(workers)
+        async def loadSong(song):
+            if hasattr(song, '_lazy__info'):
+                return
+            async with semaphore:
+                song._lazy__info, _ = await cachedScrape(
+                    session, song.url, song._scrape, None if song._trustCache else ALBUM_TTL,
+                    site=song.site)
+        await asyncio.gather(*(loadSong(song) for song in songs))
+    return songs
+
+
+async def _downloadFile(session, file, path):
+    partPath = path + PART_SUFFIX
+    async with session.get(file.url, headers=partHeaders(partPath)) as response:
+        if response.status == 416:
+            contentRange = response.headers.get('Content-Range', '')
+            if contentRange.endswith('/{}'.format(os.path.getsize(partPath))):
+                replaceFile(partPath, path)
+                removePart(partPath)
+                return
+            removePart(partPath)
+            return await _downloadFile(session, file, path)
+        if response.status == 206 and not isResumedFrom(response.headers, partPath):
+            removePart(partPath)
+            return await _downloadFile(session, file, path)
+        response.raise_for_status()
+        if response.status == 206:
+            mode = 'ab'
+        else:
+            mode = 'wb'
+            savePartValidator(partPath, response.headers)
+        with open(partPath, mode) as outFile:
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                outFile.write(chunk)
+    replaceFile(partPath, path)
+    removePart(partPath)
+
+
+async def friendlyDownloadFile(session, file, path, index, total, verbose=False):
+    """Like thehylia.friendlyDownloadFile, but asynchronous."""
+    numberStr = progressNumber(index, total)
+    filename, byTheWay = localFilename(file)
+    path = os.path.join(path, filename)
+
+    if os.path.exists(path):
+        if verbose:
+            unicodePrint("Skipping over {}: {}{}. Already exists.".format(numberStr, filename, byTheWay))
+        return True
+
+    if verbose:
+        unicodePrint("Downloading {}: {}{}...".format(numberStr, filename, byTheWay))
+    for triesElapsed in range(thehylia.TRIES):
+        try:
+            await _downloadFile(session, file, path)
+            return True
+        except DOWNLOAD_ERRORS as e:
+            if triesElapsed == thehylia.TRIES - 1 or not isRetryable(e):
+                break
+            if verbose:
+                unicodePrint("Couldn't download {}. Trying again...".format(filename), file=sys.stderr)
+            await asyncio.sleep(retryDelay(triesElapsed, e))
+    if verbose:
+        unicodePrint("Couldn't download {}. Skipping over.".format(filename), file=sys.stderr)
+    return False
+
+
+async def asyncDownload(soundtrackId, path='', makeDirs=True, formatOrder=None, verbose=False,
+                        workers=MAX_CONNECTIONS_PER_HOST, session=None, site=None):
+    """Download the soundtrack with the ID `soundtrackId` (from the site
+    `site`, if given), fetching up to `workers` song pages and files at a
+    time. Pass an aiohttp session (see makeSession) as `session` to share
+    its connections with other calls. See thehylia.Soundtrack.download for
+    the rest.
+    """
+    soundtrack = Soundtrack(soundtrackId, site)
+    path = os.path.abspath(os.path.realpath(os.path.join(os.getcwd(), path)))
+
+    async with _sessionOrNew(session) as session:
+        if verbose:
+            print("Getting song list...")
+        songs = await asyncSongs(soundtrack, session, workers)
+        if formatOrder:
+            formatOrder = [extension.lower() for extension in formatOrder]
+            if not set(soundtrack.availableFormats) & set(formatOrder):
+                if verbose:
+                    print("The soundtrack \"{}\" does not seem to be available in {}.".format(
+                          soundtrack.id,
+                          "that format" if len(formatOrder) == 1 else "any of those formats"))
+                return
+        files = [getAppropriateFile(song, formatOrder) for song in songs]
+        files.extend(soundtrack.images)
+
+        if makeDirs and not os.path.isdir(path):
+            os.makedirs(path)
+
+        semaphore = asyncio.Semaphore(workers)
+        async def downloadNumbered(fileNumber, file):
+            async with semaphore:
+                return await friendlyDownloadFile(session, file, path, fileNumber,
+                                                  len(files), verbose)
+        results = await asyncio.gather(*(downloadNumbered(fileNumber, file)
+                                         for fileNumber, file in enumerate(files, 1)))
+    return all(results)